@@ -1,456 +1,2854 @@
-import subprocess
-import sys
-import os
-import logging
-from tkinter import *
-from tkinter import ttk
-from tkinter import messagebox
-from tkinter import filedialog
-from PIL import Image
-import psutil
-import threading
-import torch
-import numpy as np
-import gc
-from concurrent.futures import ThreadPoolExecutor
-import time
-
-# Configure logging to output to console
-def configure_logging():
-    logging.basicConfig(
-        level=logging.DEBUG,
-        format="%(asctime)s [%(levelname)s] %(message)s",
-        handlers=[logging.StreamHandler()]  # Log output to console
-    )
-
-configure_logging()
-
-sys.setrecursionlimit(100000)
-
-# Stop generation flag
-stop_generation = False
-
-# CUDA optimization: Pixel values generation
-def generate_pixel_values(num_colors_start, num_colors_end, device):
-    try:
-        logging.info(f"Generating pixel values from {num_colors_start} to {num_colors_end} on {device}.")
-        # Create a range of pixel values (r, g, b)
-        num_colors_range = torch.arange(num_colors_start, num_colors_end + 1, device=device)
-        r = num_colors_range % 256
-        g = torch.div(num_colors_range, 256, rounding_mode='trunc') % 256
-        b = torch.div(num_colors_range, 256 * 256, rounding_mode='trunc') % 256
-        logging.info("Pixel values generated successfully.")
-        return r, g, b
-    except Exception as e:
-        logging.error(f"Error in generate_pixel_values: {e}")
-        raise
-
-# Get available memory (RAM and GPU) and adjust batch size accordingly
-def get_available_memory():
-    try:
-        logging.info("Getting available memory.")
-        # Get available system RAM
-        available_ram = psutil.virtual_memory().available / (1024 ** 2)  # in MB
-        if torch.cuda.is_available():
-            # Get available GPU memory
-            gpu_memory = torch.cuda.memory_allocated() / (1024 ** 2)  # in MB
-            max_gpu_memory = torch.cuda.get_device_properties(0).total_memory / (1024 ** 2)  # in MB
-            available_gpu_memory = max_gpu_memory - gpu_memory
-            logging.info(f"Available RAM: {available_ram} MB, Available GPU Memory: {available_gpu_memory} MB.")
-            return available_ram, available_gpu_memory
-        else:
-            logging.info(f"Available RAM: {available_ram} MB, No GPU available.")
-            return available_ram, 0
-    except Exception as e:
-        logging.error(f"Error in get_available_memory: {e}")
-        raise
-
-# Dynamically adjust the batch size based on available memory
-def get_batch_size(available_ram, available_gpu_memory, base_batch_size=30000):
-    try:
-        logging.info("Adjusting batch size based on available memory.")
-        # Estimate batch size based on available resources
-        estimated_batch_size = base_batch_size
-        if available_gpu_memory > 500:  # If more than 500mb GPU memory is available, use larger batch
-            estimated_batch_size = base_batch_size * 2
-        elif available_ram > 400:  # If more than 400mb system RAM is available, increase batch size
-            estimated_batch_size = base_batch_size * 1.5
-        logging.info(f"Batch size set to {estimated_batch_size}.")
-        return int(estimated_batch_size)
-    except Exception as e:
-        logging.error(f"Error in get_batch_size: {e}")
-        raise
-
-# Handle generation of images
-def generate_single_color_image(image_width, image_height, color):
-    """
-    Generates a single color image with the specified color.
-    """
-    img = Image.new("RGB", (image_width, image_height), color)
-    return img
-
-def generate_mandala_pattern(image_width, image_height, base_color, num_additional_colors):
-    """
-    Generates a mandala pattern with the specified base color and number of additional random colors.
-    """
-    img = Image.new("RGB", (image_width, image_height), base_color)
-    pixels = img.load()
-
-    # Generate random additional colors
-    additional_colors = [(np.random.randint(0, 256), np.random.randint(0, 256), np.random.randint(0, 256)) for _ in range(num_additional_colors)]
-    colors = [base_color] + additional_colors
-    num_colors = len(colors)
-    center_x, center_y = image_width // 2, image_height // 2
-
-    for y in range(image_height):
-        for x in range(image_width):
-            distance = ((x - center_x) ** 2 + (y - center_y) ** 2) ** 0.5
-            color_index = int(distance) % num_colors
-            next_color_index = (color_index + 1) % num_colors
-
-            # Calculate the blend factor
-            blend_factor = distance % 1
-
-            # Blend the colors smoothly
-            r = int(colors[color_index][0] * (1 - blend_factor) + colors[next_color_index][0] * blend_factor)
-            g = int(colors[color_index][1] * (1 - blend_factor) + colors[next_color_index][1] * blend_factor)
-            b = int(colors[color_index][2] * (1 - blend_factor) + colors[next_color_index][2] * blend_factor)
-
-            pixels[x, y] = (r, g, b)
-
-    return img
-
-def generate_images(output_dir, num_colors_start, num_colors_end, image_width, image_height, colors_per_image, pattern_type, progress_label, progress_bar, info_label, elapsed_label, update_progress_callback):
-    global stop_generation
-    try:
-        logging.info(f"Starting image generation. Output directory: {output_dir}, Color range: {num_colors_start}-{num_colors_end}, Image size: {image_width}x{image_height}, Colors per image: {colors_per_image}, Pattern type: {pattern_type}.")
-        
-        # Check if 'RGB_Colors' is already in the output_dir
-        if not output_dir.endswith("RGB_Colors"):
-            output_dir = os.path.join(output_dir, "RGB_Colors")
-        
-        # Create the main 'RGB_Colors' folder if it doesn't exist
-        os.makedirs(output_dir, exist_ok=True)
-        logging.info(f"Created output directory: {output_dir}.")
-
-        # Create the subfolder for the pattern type (e.g., Single or Mandala)
-        pattern_folder = os.path.join(output_dir, pattern_type.capitalize())
-        os.makedirs(pattern_folder, exist_ok=True)
-        logging.info(f"Created pattern folder: {pattern_folder}.")
-
-        # Create the subfolder named after the image size (e.g., 1x1 or 2x3) inside the pattern folder
-        size_folder = f"{image_width}x{image_height}"
-        color_folder = os.path.join(pattern_folder, size_folder)
-        os.makedirs(color_folder, exist_ok=True)  # Ensure the subfolder for the size is created
-        logging.info(f"Created size folder: {color_folder}.")
-
-        total_images = (num_colors_end - num_colors_start)
-        images_generated = 0
-        skipped_images = 0
-        start_time = time.time()
-
-        # Function to update progress
-        def update_progress():
-            if images_generated > 0:
-                elapsed_time = time.time() - start_time
-                estimated_time = (elapsed_time / images_generated) * (total_images - images_generated)
-
-                images_per_second = images_generated / elapsed_time if elapsed_time > 0 else 0
-        
-                update_progress_callback(images_generated, total_images, estimated_time, images_per_second, skipped_images, elapsed_time)
-
-        # Dynamically select the device (GPU or CPU)
-        device = get_device()
-
-        # Function to process a batch of images
-        def process_batch(batch_idx, start_idx, end_idx, color_folder):
-            nonlocal images_generated, skipped_images
-            r_values, g_values, b_values = generate_pixel_values(start_idx, end_idx, device)
-
-            # Generate images for the batch
-            for idx in range(len(r_values)):
-                if stop_generation:
-                    break
-
-                base_color = (r_values[idx].item(), g_values[idx].item(), b_values[idx].item())
-                hex_color = f"{r_values[idx].item():02X}{g_values[idx].item():02X}{b_values[idx].item():02X}"
-                file_name = f"{hex_color}.png"
-                file_path = os.path.join(color_folder, file_name)
-
-                # Skip if the image already exists
-                if os.path.exists(file_path):
-                    skipped_images += 1
-                    update_progress()  # Update even when skipping an image
-                    continue
-
-                # Generate the image based on the selected pattern type
-                if pattern_type == "mandala":
-                    img = generate_mandala_pattern(image_width, image_height, base_color, colors_per_image - 1)
-                else:
-                    img = generate_single_color_image(image_width, image_height, base_color)  # Single color image
-
-                img.save(file_path)
-                images_generated += 1
-                update_progress()
-
-            # Free GPU memory after processing the batch
-            torch.cuda.empty_cache()
-            logging.info(f"Batch {batch_idx} processed successfully.")
-
-        # Executor for parallel processing of batches
-        with ThreadPoolExecutor(max_workers=4) as executor:  # Begrenzung der parallelen Threads auf 4
-            # Get available memory to determine batch size
-            available_ram, available_gpu_memory = get_available_memory()
-            batch_size = get_batch_size(available_ram, available_gpu_memory)
-            total_colors = num_colors_end - num_colors_start
-            batches = total_colors // batch_size + (1 if total_colors % batch_size != 0 else 0)
-
-            # Submit batch processing jobs
-            futures = []
-            for batch_idx in range(batches):
-                if stop_generation:
-                    break
-
-                start_idx = num_colors_start + batch_idx * batch_size
-                end_idx = min(num_colors_start + (batch_idx + 1) * batch_size - 1, num_colors_end - 1)
-
-                futures.append(executor.submit(process_batch, batch_idx, start_idx, end_idx, color_folder))
-
-            # Wait for all futures to complete
-            for future in futures:
-                future.result()
-
-            gc.collect()
-
-        # Show completion message
-        if not stop_generation:
-            messagebox.showinfo("Finished", "The images have been successfully generated!")
-            logging.info("Image generation completed successfully.")
-        else:
-            messagebox.showinfo("Aborted", "The image generation has been stopped.")
-            logging.info("Image generation was stopped by the user.")
-
-    except Exception as e:
-        # Handle errors
-        logging.error(f"Error during image generation: {e}", exc_info=True)
-        messagebox.showerror("Error", f"An error occurred: {e}")
-
-# Format time function
-def format_time(seconds):
-    try:
-        # Convert seconds to days, hours, minutes, and seconds
-        days, remainder = divmod(seconds, 86400)  # 1 day = 86400 seconds
-        hours, remainder = divmod(remainder, 3600)  # 1 hour = 3600 seconds
-        minutes, seconds = divmod(remainder, 60)  # 1 minute = 60 seconds
-
-        # Ensure seconds are shown as whole numbers (no decimals)
-        days = int(days)
-        hours = int(hours)
-        minutes = int(minutes)
-        seconds = int(seconds)
-        
-        if days > 0:
-            return f"{days} Days, {hours} h"
-        else:
-            return f"{hours} h {minutes} min {seconds} sec"
-    except Exception as e:
-        logging.error(f"Error in format_time: {e}")
-        raise
-
-# Folder selection dialog
-def select_output_folder():
-    try:
-        folder = filedialog.askdirectory()
-        if folder:
-            app.output_dir_var.set(os.path.join(folder, "RGB_Colors"))
-            logging.info(f"Output directory selected: {folder}/RGB_Colors")
-    except Exception as e:
-        logging.error(f"Error in select_output_folder: {e}")
-        messagebox.showerror("Error", f"An error occurred: {e}")
-
-# Start generation
-def start_generation():
-    global stop_generation
-    stop_generation = False
-    try:
-        logging.info("Starting image generation process.")
-        threading.Thread(target=generate_images, args=(
-            app.output_dir_var.get(),
-            app.num_colors_start_var.get(),
-            app.num_colors_end_var.get(),
-            app.image_width_var.get(),
-            app.image_height_var.get(),
-            app.colors_per_image_var.get(),
-            app.pattern_type_var.get(),
-            app.progress_label,
-            app.progress_bar,
-            app.info_label,
-            app.elapsed_label,
-            app.update_progress_gui
-        ), daemon=True).start()
-    except RuntimeError as e:
-        logging.error(f"Error in start_generation: {e}")
-        messagebox.showerror("Error", f"An error occurred: {e}")
-
-# Stop generation process
-def stop_generation_process():
-    global stop_generation
-    try:
-        stop_generation = True
-        logging.info("Stopping image generation process.")
-    except Exception as e:
-        logging.error(f"Error in stop_generation_process: {e}")
-        messagebox.showerror("Error", f"An error occurred: {e}")
-
-# Update progress bar
-def update_progress_gui(images_generated, total_images, estimated_time, images_per_second, skipped_images, elapsed_time):
-    try:
-        app.progress_label.config(
-            text=f"Progress: {images_generated}/{total_images} "
-                 f"Remaining time: {format_time(estimated_time)}"
-        )
-        app.progress_bar['value'] = (images_generated / total_images) * 100
-        app.info_label.config(text=f"Skipped Images: {skipped_images}")
-        app.speed_label.config(text=f"Images per Second: {images_per_second:.2f}")
-        app.elapsed_label.config(text=f"Elapsed Time: {format_time(elapsed_time)}")
-        logging.info(f"Progress: {images_generated}/{total_images}, Remaining time: {format_time(estimated_time)}, Images per second: {images_per_second:.2f}, Elapsed time: {format_time(elapsed_time)}, Skipped images: {skipped_images}")
-    except Exception as e:
-        logging.error(f"Error in update_progress_gui: {e}")
-        messagebox.showerror("Error", f"An error occurred: {e}")
-
-# Get device (CPU or GPU)
-def get_device():
-    try:
-        if torch.cuda.is_available():
-            device = torch.device("cuda")
-            torch.backends.cudnn.benchmark = True
-            logging.info("Using GPU for computation.")
-        else:
-            device = torch.device("cpu")
-            logging.info("Using CPU for computation.")
-        return device
-    except Exception as e:
-        logging.error(f"Error in device selection: {e}")
-        messagebox.showerror("Error", f"An error occurred: {e}")
-        return torch.device("cpu")
-
-# Reset color range to default values
-def reset_color_range():
-    try:
-        app.num_colors_start_var.set(0)
-        app.num_colors_end_var.set(16777215)
-        logging.info("Color range reset to default values.")
-    except Exception as e:
-        logging.error(f"Error in reset_color_range: {e}")
-        messagebox.showerror("Error", f"An error occurred: {e}")
-
-# GUI class
-class RGBPixelGeneratorGUI:
-    def __init__(self, root):
-        self.root = root
-        self.root.title("RGB_Pixel_Generator")
-        self.root.resizable(True, True)  # Allow window resizing
-
-        # Colors for the design
-        bg_color = "#1D3557"        # Background color of the main window
-        label_color = "#457B9D"     # Label color
-        entry_bg_color = "#A8DADC"  # Background color of entry fields
-        button_color = "#E63946"    # Button background color
-        button_text_color = "white" # Button text color
-        entry_text_color = "black"  # Entry text color
-
-        self.root.configure(bg=bg_color)
-
-        # Define labels and input fields
-        Label(self.root, text="Output dir:", bg=label_color, fg="white", font=("Arial", 10, "bold")).grid(row=0, column=0, padx=10, pady=10, sticky=W)
-        self.output_dir_var = StringVar()
-        output_dir_entry = Entry(self.root, textvariable=self.output_dir_var, width=40, bg=entry_bg_color, fg=entry_text_color, font=("Arial", 10))
-        output_dir_entry.grid(row=0, column=1, padx=10, pady=10)
-        output_dir_button = Button(self.root, text="Output", command=select_output_folder, bg=button_color, fg=button_text_color, font=("Arial", 10, "bold"))
-        output_dir_button.grid(row=0, column=2, padx=10, pady=10)
-
-        Label(self.root, text="Image size:", bg=label_color, fg="white", font=("Arial", 10, "bold")).grid(row=2, column=0, padx=10, pady=10, sticky=W)
-        self.image_width_var = IntVar(value=1)
-        image_width_entry = Entry(self.root, textvariable=self.image_width_var, width=10, bg=entry_bg_color, fg=entry_text_color, font=("Arial", 10))
-        image_width_entry.grid(row=2, column=1, padx=10, pady=10, sticky=W)
-        Label(self.root, text="x", bg=label_color, fg="white", font=("Arial", 10, "bold")).grid(row=2, column=1, padx=70, pady=10, sticky=W)
-        self.image_height_var = IntVar(value=1)
-        image_height_entry = Entry(self.root, textvariable=self.image_height_var, width=10, bg=entry_bg_color, fg=entry_text_color, font=("Arial", 10))
-        image_height_entry.grid(row=2, column=1, padx=100, pady=10, sticky=W)
-
-        Label(self.root, text="Color range:", bg=label_color, fg="white", font=("Arial", 10, "bold")).grid(row=3, column=0, padx=10, pady=10, sticky=W)
-        self.num_colors_start_var = IntVar(value=0)
-        self.num_colors_end_var = IntVar(value=16777215)
-        num_colors_start_entry = Entry(self.root, textvariable=self.num_colors_start_var, width=10, bg=entry_bg_color, fg=entry_text_color, font=("Arial", 10))
-        num_colors_start_entry.grid(row=3, column=1, padx=10, pady=10, sticky=W)
-        Label(self.root, text="to", bg=label_color, fg="white", font=("Arial", 10, "bold")).grid(row=3, column=1, padx=70, pady=10, sticky=W)
-        num_colors_end_entry = Entry(self.root, textvariable=self.num_colors_end_var, width=10, bg=entry_bg_color, fg=entry_text_color, font=("Arial", 10))
-        num_colors_end_entry.grid(row=3, column=1, padx=100, pady=10, sticky=W)
-        reset_button = Button(self.root, text="Reset", command=reset_color_range, bg=button_color, fg=button_text_color, font=("Arial", 8, "bold"))
-        reset_button.grid(row=3, column=2, padx=10, pady=10, sticky=W)
-
-        Label(self.root, text="Colors per image:", bg=label_color, fg="white", font=("Arial", 10, "bold")).grid(row=4, column=0, padx=10, pady=10, sticky=W)
-        self.colors_per_image_var = IntVar(value=5)
-        colors_per_image_entry = Entry(self.root, textvariable=self.colors_per_image_var, width=10, bg=entry_bg_color, fg=entry_text_color, font=("Arial", 10))
-        colors_per_image_entry.grid(row=4, column=1, padx=10, pady=10, sticky=W)
-
-        Label(self.root, text="Pattern type:", bg=label_color, fg="white", font=("Arial", 10, "bold")).grid(row=5, column=0, padx=10, pady=10, sticky=W)
-        self.pattern_type_var = StringVar(value="single")
-        pattern_type_menu = OptionMenu(self.root, self.pattern_type_var, "single", "mandala")
-        pattern_type_menu.config(bg=entry_bg_color, fg=entry_text_color, font=("Arial", 10))
-        pattern_type_menu.grid(row=5, column=1, padx=10, pady=10, sticky=W)
-
-        # Progress label and frame for speed and elapsed time
-        self.progress_label = Label(self.root, text="Progress: 0/0 images generated.", bg=bg_color, fg="white", font=("Arial", 10))
-        self.progress_label.grid(row=6, column=0, columnspan=3, pady=5)
-
-        speed_frame = Frame(self.root, bg=bg_color)
-        speed_frame.grid(row=7, column=0, columnspan=3, padx=10, pady=10)
-
-        self.speed_label = Label(speed_frame, text="Image per second: 0", bg=bg_color, fg="white", font=("Arial", 10))
-        self.speed_label.grid(row=0, column=0, columnspan=3, pady=0)
-
-        self.elapsed_label = Label(speed_frame, text="Elapsed Time: 00:00:00", bg=bg_color, fg="white", font=("Arial", 10))
-        self.elapsed_label.grid(row=1, column=0, columnspan=3, pady=0)
-
-        self.progress_bar = ttk.Progressbar(self.root, length=500, mode='determinate')
-        self.progress_bar.grid(row=8, column=0, columnspan=3, padx=10, pady=5)
-
-        self.info_label = Label(self.root, text="Skipped images: 0", bg=bg_color, fg="white", font=("Arial", 10))
-        self.info_label.grid(row=9, column=0, columnspan=3, pady=5)
-
-        # Buttons (Start and Stop)
-        button_frame = Frame(self.root, bg=bg_color)
-        button_frame.grid(row=10, column=0, columnspan=3, padx=10, pady=10)
-
-        start_button = Button(button_frame, text="Start", command=start_generation, bg=button_color, fg=button_text_color, font=("Arial", 12))
-        start_button.grid(row=0, column=0, padx=10)
-
-        stop_button = Button(button_frame, text="Stop", command=stop_generation_process, bg=button_color, fg=button_text_color, font=("Arial", 12))
-        stop_button.grid(row=0, column=1, padx=10)
-
-    def update_progress_gui(self, images_generated, total_images, estimated_time, images_per_second, skipped_images, elapsed_time):
-        try:
-            self.progress_label.config(
-                text=f"Progress: {images_generated}/{total_images} "
-                     f"Remaining time: {format_time(estimated_time)}"
-            )
-            self.progress_bar['value'] = (images_generated / total_images) * 100
-            self.info_label.config(text=f"Skipped Images: {skipped_images}")
-            self.speed_label.config(text=f"Images per Second: {images_per_second:.2f}")
-            self.elapsed_label.config(text=f"Elapsed Time: {format_time(elapsed_time)}")
-            logging.info(f"Progress: {images_generated}/{total_images}, Remaining time: {format_time(estimated_time)}, Images per second: {images_per_second:.2f}, Elapsed time: {format_time(elapsed_time)}, Skipped images: {skipped_images}")
-        except Exception as e:
-            logging.error(f"Error in update_progress_gui: {e}")
-            messagebox.showerror("Error", f"An error occurred: {e}")
-
-# Start the main loop of the Tkinter window
-def start_gui():
-    global app
-    root = Tk()
-    app = RGBPixelGeneratorGUI(root)
-    root.mainloop()
-
-if __name__ == "__main__":
-    # Start the GUI in the main thread
-    start_gui()
+import subprocess
+import sys
+import os
+import logging
+try:
+    from tkinter import *
+    from tkinter import ttk
+    from tkinter import messagebox
+    from tkinter import filedialog
+except ImportError:
+    # Headless systems without Tk can still use the command line interface
+    Tk = ttk = messagebox = filedialog = None
+from PIL import Image
+import threading
+import numpy as np
+import gc
+from concurrent.futures import ProcessPoolExecutor, wait
+import time
+import io
+import re
+import tarfile
+import tempfile
+import queue
+import struct
+import zlib
+import functools
+import argparse
+import json
+import multiprocessing
+import signal
+import socket
+import cProfile
+import pstats
+
+# Configure logging to output to console
+def configure_logging():
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s [%(levelname)s] %(message)s",
+        handlers=[logging.StreamHandler()]  # Log output to console
+    )
+
+configure_logging()
+
+sys.setrecursionlimit(100000)
+
+# Stop generation flag
+stop_generation = False
+
+# Files created with tempfile.mkstemp are private (0600); the ones renamed into place get the mode
+# open() would give them, so other accounts can read them on shared storage
+def get_umask():
+    umask = os.umask(0)
+    os.umask(umask)
+    return umask
+
+SHARED_FILE_MODE = 0o666 & ~get_umask()
+
+# Optional GPU support: torch is imported on first use only, it takes seconds and hundreds of MB
+# to load and is not needed by the NumPy backend
+def import_torch():
+    try:
+        import torch
+    except ImportError as e:
+        raise RuntimeError("The cuda device requires the torch library.") from e
+    return torch
+
+def is_cuda_available():
+    try:
+        import torch
+    except ImportError:
+        return False
+    return torch.cuda.is_available()
+
+def is_gpu_device(device):
+    return device is not None and str(device) != "cpu"
+
+def uses_torch(device):
+    """
+    The device name "cpu" selects the NumPy backend. "cuda" and torch.device objects render with
+    torch, a torch.device("cpu") runs the same code path on CPU tensors.
+    """
+    return device is not None and not (isinstance(device, str) and device == "cpu")
+
+# Pinned host buffers of the device-to-host copies, kept per thread and device: allocating
+# pinned memory is expensive, often more than the copy itself
+pinned_host_buffers = threading.local()
+
+def get_pinned_host_buffer(device, num_bytes):
+    """
+    Returns a pinned uint8 host tensor of at least num_bytes for copies from device, reusing
+    the buffer of this thread and growing it when a larger batch arrives.
+    """
+    buffers = getattr(pinned_host_buffers, "buffers", None)
+    if buffers is None:
+        buffers = pinned_host_buffers.buffers = {}
+    buffer = buffers.get(device)
+    if buffer is None or buffer.numel() < num_bytes:
+        torch = import_torch()
+        buffer = buffers[device] = torch.empty(num_bytes, dtype=torch.uint8, pin_memory=True)
+    return buffer
+
+def copy_to_host(pixels):
+    """
+    Returns a batch of rendered images as a NumPy array, copying a CUDA tensor in a single
+    device-to-host transfer into the reusable pinned buffer of this thread. The result is copied
+    out of the buffer, so it stays valid while the pipeline holds it. NumPy arrays are returned unchanged.
+    """
+    if isinstance(pixels, np.ndarray):
+        return pixels
+    if pixels.device.type == "cpu":
+        return pixels.numpy()
+    num_bytes = pixels.numel() * pixels.element_size()
+    host_pixels = get_pinned_host_buffer(str(pixels.device), num_bytes)[:num_bytes].view(pixels.dtype).view(pixels.shape)
+    host_pixels.copy_(pixels)
+    return host_pixels.numpy().copy()
+
+# Get available memory (RAM and, if use_gpu, GPU) in MB
+def get_available_memory(use_gpu=False):
+    try:
+        import psutil
+        logging.info("Getting available memory.")
+        # Get available system RAM
+        available_ram = psutil.virtual_memory().available / (1024 ** 2)  # in MB
+        if use_gpu and is_cuda_available():
+            torch = import_torch()
+            # Free GPU memory as reported by the driver (includes other processes), plus the memory
+            # the caching allocator of this process has reserved but not handed out
+            free_gpu_memory, _ = torch.cuda.mem_get_info()
+            reusable_gpu_memory = torch.cuda.memory_reserved() - torch.cuda.memory_allocated()
+            available_gpu_memory = (free_gpu_memory + reusable_gpu_memory) / (1024 ** 2)  # in MB
+            logging.info(f"Available RAM: {available_ram} MB, Available GPU Memory: {available_gpu_memory} MB.")
+            return available_ram, available_gpu_memory
+        else:
+            logging.info(f"Available RAM: {available_ram} MB, No GPU available.")
+            return available_ram, 0
+    except Exception as e:
+        logging.error(f"Error in get_available_memory: {e}")
+        raise
+
+# Memory planning for the generation pipeline
+MEMORY_BUDGET_FRACTION = 0.5  # Share of the free memory a run may use
+MIN_BATCH_SIZE = 1024
+MAX_BATCH_SIZE = 1 << 20
+COLOR_ENUMERATION_BYTES = 64  # Color tensors, completion mask and bookkeeping per enumerated color
+IMAGE_OVERHEAD_BYTES = 256  # Python objects (tuples, hex names, bytes headers) per image in flight
+MANDALA_RENDER_BYTES_PER_PIXEL = 3 * 8 * 5  # Gathered int64 colors and float64 blend temporaries
+
+class BatchSizePlanner:
+    """
+    Plans how many colors are enumerated per batch, how many mandala images are rendered per call
+    and how many images travel through the pipeline queues per chunk. The plan starts from an
+    estimate of the bytes per image (size, pattern, colors per image) and the memory that is
+    actually free, and is adapted between batches from the observed peak RSS and CUDA allocator stats.
+    targets is a list of dicts with image_width, image_height, pattern_type and colors_per_image;
+    every color is rendered for all of them, so the estimates per color are summed over the targets.
+    """
+    def __init__(self, targets, available_ram, available_gpu_memory, processes=1, render_threads=1, on_gpu=False):
+        self.image_bytes = 0
+        self.render_bytes = 0
+        for target in targets:
+            pixels = target["image_width"] * target["image_height"]
+            self.image_bytes += pixels * 3 + IMAGE_OVERHEAD_BYTES
+            if target["pattern_type"] == "mandala":
+                self.render_bytes += pixels * MANDALA_RENDER_BYTES_PER_PIXEL + target["colors_per_image"] * 3 * 8
+        self.on_gpu = on_gpu
+        self.render_threads = max(1, render_threads)
+        # Every worker process plans for its share of the free memory
+        self.host_budget = available_ram * 1024 ** 2 * MEMORY_BUDGET_FRACTION / max(1, processes)
+        self.gpu_budget = available_gpu_memory * 1024 ** 2 * MEMORY_BUDGET_FRACTION / max(1, processes)
+        import psutil
+        self.process = psutil.Process()
+        # RSS at the start of the current batch, the growth from there is what a batch costs
+        self.batch_start_rss = self.process.memory_info().rss
+        self.peak_rss = self.batch_start_rss
+        self.plan()
+
+    @staticmethod
+    def clamp(value, lower, upper):
+        return int(max(lower, min(upper, value)))
+
+    def plan(self):
+        # Encoded chunks in flight: the encode and write queues plus the chunks being worked on
+        in_flight_chunks = 2 * PIPELINE_QUEUE_SIZE + self.render_threads + PIPELINE_WRITE_THREADS
+        self.chunk_size = self.clamp(self.host_budget / 2 // (in_flight_chunks * 2 * self.image_bytes), 1, PIPELINE_CHUNK_SIZE)
+
+        # Rendered images stay alive until their last chunk is written
+        render_host_bytes = self.image_bytes * (PIPELINE_QUEUE_SIZE + 2) + (0 if self.on_gpu else self.render_bytes)
+        self.render_chunk_size = self.clamp(self.host_budget / 2 // (self.render_threads * render_host_bytes), 1, PIPELINE_RENDER_CHUNK_SIZE)
+        if self.on_gpu and self.render_bytes:
+            self.render_chunk_size = self.clamp(self.gpu_budget // (self.render_threads * self.render_bytes), 1, self.render_chunk_size)
+
+        self.max_batch_size = self.clamp(self.host_budget / 4 // COLOR_ENUMERATION_BYTES, MIN_BATCH_SIZE, MAX_BATCH_SIZE)
+        self.batch_size = self.max_batch_size
+        logging.info(f"Planned batch size {self.batch_size}, render chunk {self.render_chunk_size}, pipeline chunk {self.chunk_size} "
+                     f"({self.image_bytes} bytes per image, {self.host_budget / 1024 ** 2:.0f} MB RAM budget).")
+
+    def max_buffered_images(self):
+        """
+        Number of images a shard writer may buffer within a quarter of the RAM budget (per target).
+        """
+        return max(1, int(self.host_budget / 4 // self.image_bytes))
+
+    def sample(self):
+        self.peak_rss = max(self.peak_rss, self.process.memory_info().rss)
+
+    def adapt(self):
+        """
+        Called between batches: shrinks the batch and the chunks if the peak memory growth during
+        the last batch exceeds the budget and grows them (up to the planned limits) while it stays
+        well below. The growth is measured from the RSS at the start of every batch, so memory the
+        allocator keeps after earlier batches does not shrink every following batch.
+        """
+        self.sample()
+        used = self.peak_rss - self.batch_start_rss
+        scale = 0.5 if used > self.host_budget else 2 if used < self.host_budget / 4 else 1
+        if self.on_gpu:
+            torch = import_torch()
+            peak_gpu = torch.cuda.max_memory_allocated()
+            torch.cuda.reset_peak_memory_stats()
+            if peak_gpu > self.gpu_budget:
+                scale = 0.5
+            elif peak_gpu > self.gpu_budget / 4:
+                scale = min(scale, 1)
+
+        if scale != 1:
+            self.batch_size = self.clamp(self.batch_size * scale, MIN_BATCH_SIZE, self.max_batch_size)
+            self.chunk_size = self.clamp(self.chunk_size * scale, 1, PIPELINE_CHUNK_SIZE)
+            self.render_chunk_size = self.clamp(self.render_chunk_size * scale, 1, PIPELINE_RENDER_CHUNK_SIZE)
+            logging.debug(f"Observed {used / 1024 ** 2:.0f} MB peak RSS growth, batch size {self.batch_size}, render chunk {self.render_chunk_size}, pipeline chunk {self.chunk_size}.")
+        self.batch_start_rss = self.peak_rss = self.process.memory_info().rss
+
+# Handle generation of images
+def generate_single_color_image(image_width, image_height, color):
+    """
+    Generates a single color image with the specified color.
+    """
+    img = Image.new("RGB", (image_width, image_height), color)
+    return img
+
+# Cache of mandala distance fields, keyed by image size (and device for torch tensors)
+mandala_field_cache = {}
+mandala_field_lock = threading.Lock()
+
+def get_mandala_distance_field(image_width, image_height, device=None):
+    """
+    Returns the ring index (integer part of the distance to the center) and the blend factor
+    (fractional part) of every pixel. The field only depends on the image size, so it is cached.
+    """
+    on_device = uses_torch(device)
+    key = (image_width, image_height, str(device) if on_device else "numpy")
+    field = mandala_field_cache.get(key)
+    if field is not None:
+        return field
+
+    center_x, center_y = image_width // 2, image_height // 2
+    y, x = np.mgrid[0:image_height, 0:image_width]
+    distance = np.sqrt(((x - center_x) ** 2 + (y - center_y) ** 2).astype(np.float64))
+    ring = distance.astype(np.int64)
+    blend = distance % 1
+    if on_device:
+        torch = import_torch()
+        ring = torch.from_numpy(ring).to(device)
+        blend = torch.from_numpy(blend).to(device)
+
+    with mandala_field_lock:
+        field = mandala_field_cache.setdefault(key, (ring, blend))
+    return field
+
+# Counter-based random numbers for the mandala colors (Philox4x32-10, Random123)
+PHILOX_MULTIPLIERS = (np.uint64(0xD2511F53), np.uint64(0xCD9E8D57))
+PHILOX_KEY_INCREMENTS = (np.uint64(0x9E3779B9), np.uint64(0xBB67AE85))
+PHILOX_ROUNDS = 10
+DEFAULT_MANDALA_SEED = 0
+
+def philox4x32(counter, key):
+    """
+    Philox4x32-10 on arrays: counter is a (..., 4) and key a (..., 2) uint32 array (broadcast
+    against each other). Returns the (..., 4) uint32 random words of every counter.
+    """
+    mask = np.uint64(0xFFFFFFFF)
+    c0, c1, c2, c3 = (counter[..., i].astype(np.uint64) for i in range(4))
+    k0, k1 = (key[..., i].astype(np.uint64) for i in range(2))
+    for _ in range(PHILOX_ROUNDS):
+        # 32 x 32 bit products fit into 64 bits, their halves are the hi/lo words
+        product0 = c0 * PHILOX_MULTIPLIERS[0]
+        product1 = c2 * PHILOX_MULTIPLIERS[1]
+        c0, c1, c2, c3 = (product1 >> np.uint64(32)) ^ c1 ^ k0, product1 & mask, (product0 >> np.uint64(32)) ^ c3 ^ k1, product0 & mask
+        k0 = (k0 + PHILOX_KEY_INCREMENTS[0]) & mask
+        k1 = (k1 + PHILOX_KEY_INCREMENTS[1]) & mask
+    return np.stack((c0, c1, c2, c3), axis=-1).astype(np.uint32)
+
+def draw_mandala_colors(color_indices, num_additional_colors, seed=DEFAULT_MANDALA_SEED):
+    """
+    Draws the additional colors of every image in one vectorized call. The random stream of an
+    image is Philox keyed by the seed, with its color index and block number as counter, so any
+    image can be regenerated or verified on its own. Returns an (N, num_additional_colors, 3) uint8 array.
+    """
+    color_indices = np.asarray(color_indices, dtype=np.uint32).reshape(-1)
+    num_bytes = num_additional_colors * 3
+    if num_bytes <= 0:
+        return np.zeros((len(color_indices), 0, 3), dtype=np.uint8)
+
+    num_blocks = -(-num_bytes // 16)  # Every counter yields 16 random bytes
+    counter = np.zeros((len(color_indices), num_blocks, 4), dtype=np.uint32)
+    counter[..., 0] = color_indices[:, None]
+    counter[..., 1] = np.arange(num_blocks, dtype=np.uint32)
+    key = np.array([seed & 0xFFFFFFFF, (seed >> 32) & 0xFFFFFFFF], dtype=np.uint32)
+    random_bytes = philox4x32(counter, key).astype("<u4").view(np.uint8).reshape(len(color_indices), -1)
+    return random_bytes[:, :num_bytes].reshape(len(color_indices), num_additional_colors, 3)
+
+def render_mandala_batch(image_width, image_height, base_colors, num_additional_colors, device=None, seed=DEFAULT_MANDALA_SEED, additional_colors=None):
+    """
+    Renders the mandala pattern for many base colors at once.
+    base_colors is a sequence of (r, g, b) tuples, the result is an (N, H, W, 3) uint8 array.
+    The additional colors only depend on the seed and the base color (see draw_mandala_colors);
+    additional_colors passes them in when they were already drawn for the batch.
+    With a torch device the whole batch is rendered on the device and copied back in one transfer.
+    """
+    base_colors = np.asarray(base_colors, dtype=np.int64).reshape(-1, 3)
+    num_additional_colors = max(0, num_additional_colors)
+
+    # Draw the random additional colors for all images in one call, keyed by their color index
+    if additional_colors is None:
+        color_indices = base_colors[:, 0] + base_colors[:, 1] * 256 + base_colors[:, 2] * 65536
+        additional_colors = draw_mandala_colors(color_indices, num_additional_colors, seed)
+    additional_colors = additional_colors[:, :num_additional_colors]
+    palette = np.concatenate([base_colors[:, None, :], additional_colors.astype(np.int64)], axis=1)
+    num_colors = palette.shape[1]
+
+    ring, blend = get_mandala_distance_field(image_width, image_height, device)
+
+    if isinstance(ring, np.ndarray):
+        color_index = ring % num_colors
+        next_color_index = (color_index + 1) % num_colors
+        blend_factor = blend[None, :, :, None]
+        blended = palette[:, color_index] * (1 - blend_factor) + palette[:, next_color_index] * blend_factor
+        return blended.astype(np.uint8)
+
+    torch = import_torch()
+    palette = torch.from_numpy(palette).to(ring.device)
+    color_index = ring % num_colors
+    next_color_index = (color_index + 1) % num_colors
+    blend_factor = blend[None, :, :, None]
+    blended = palette[:, color_index] * (1 - blend_factor) + palette[:, next_color_index] * blend_factor
+    return copy_to_host(blended.to(torch.uint8))
+
+def render_solid_color_batch(image_width, image_height, base_colors, device=None):
+    """
+    Fills one image per base color, the result is an (N, H, W, 3) uint8 array.
+    With a torch device the batch is filled on the device and copied back in one transfer.
+    """
+    base_colors = np.asarray(base_colors, dtype=np.uint8).reshape(-1, 1, 1, 3)
+    shape = (len(base_colors), image_height, image_width, 3)
+    if not uses_torch(device):
+        return np.ascontiguousarray(np.broadcast_to(base_colors, shape))
+
+    torch = import_torch()
+    colors = torch.from_numpy(base_colors).to(device)
+    return copy_to_host(colors.expand(shape).contiguous())
+
+def generate_mandala_pattern(image_width, image_height, base_color, num_additional_colors, seed=DEFAULT_MANDALA_SEED):
+    """
+    Generates a mandala pattern with the specified base color and number of additional random colors.
+    """
+    pixels = render_mandala_batch(image_width, image_height, [base_color], num_additional_colors, seed=seed)
+    return Image.fromarray(pixels[0])
+
+# PNG compression level (0 = stored, 1 = fastest, 9 = smallest), 6 is the Pillow default
+DEFAULT_PNG_COMPRESS_LEVEL = 6
+
+class SolidColorPngEncoder:
+    """
+    Encodes solid color PNG images of a fixed size without going through Pillow.
+    The signature, IHDR and IEND chunks are precomputed, so only the scanlines of the
+    color are built and compressed into the IDAT chunk (with its CRC) for every image.
+    """
+    def __init__(self, image_width, image_height, compress_level=DEFAULT_PNG_COMPRESS_LEVEL):
+        self.image_width = image_width
+        self.image_height = image_height
+        self.compress_level = compress_level
+        ihdr = struct.pack(">IIBBBBB", image_width, image_height, 8, 2, 0, 0, 0)  # 8 bit RGB, no interlace
+        self.header = b"\x89PNG\r\n\x1a\n" + self.chunk(b"IHDR", ihdr)
+        self.footer = self.chunk(b"IEND", b"")
+
+    @staticmethod
+    def chunk(chunk_type, data):
+        return struct.pack(">I", len(data)) + chunk_type + data + struct.pack(">I", zlib.crc32(chunk_type + data))
+
+    def encode(self, color):
+        # Every scanline is the filter byte 0 (None) followed by the color repeated over the width
+        scanline = b"\x00" + bytes(color) * self.image_width
+        idat = zlib.compress(scanline * self.image_height, self.compress_level)
+        return self.header + self.chunk(b"IDAT", idat) + self.footer
+
+@functools.lru_cache(maxsize=64)
+def get_solid_color_png_encoder(image_width, image_height, compress_level=DEFAULT_PNG_COMPRESS_LEVEL):
+    return SolidColorPngEncoder(image_width, image_height, compress_level)
+
+def encode_png(pixels, compress_level=DEFAULT_PNG_COMPRESS_LEVEL):
+    """
+    Encodes an (H, W, 3) uint8 array as PNG with Pillow.
+    """
+    data = io.BytesIO()
+    Image.fromarray(np.ascontiguousarray(pixels)).save(data, format="PNG", compress_level=compress_level)
+    return data.getvalue()
+
+# Output formats: one PNG file per color, or packed shards of many images
+OUTPUT_FORMATS = ("png", "npy", "tar")
+DEFAULT_SHARD_SIZE = 10000
+
+# Convert between the color index (r + g * 256 + b * 65536) and the hex name (RRGGBB)
+def color_index_to_hex(color_index):
+    return f"{color_index % 256:02X}{color_index // 256 % 256:02X}{color_index // 65536 % 256:02X}"
+
+def hex_to_color_index(hex_color):
+    return int(hex_color[0:2], 16) + int(hex_color[2:4], 16) * 256 + int(hex_color[4:6], 16) * 65536
+
+class CompletionManifest:
+    """
+    Persistent record of the finished colors of a color folder: one byte per color of the 24-bit
+    color space in a memory-mapped file (.completed_<format>.bitmap, 16 MB, sparse on most file systems).
+    Writers mark a color only after its image is on disk. Every worker owns distinct colors and
+    therefore distinct bytes, so the threads and processes of one machine can share the file
+    without locking. Machines that share the folder over network storage write back whole pages and
+    would overwrite each other's marks, so in a distributed run every machine writes its own manifest
+    (.completed_<format>/<owner>.bitmap) and reads the others and the shared one read-only.
+    Rebuilds are written to a temporary file and renamed, so the manifest is never half-written.
+    Verifying rebuilds it from the files on disk, which hold every image the machine manifests
+    recorded, so it discards them, except the manifests of machines that are still writing.
+    """
+    num_colors = 256 ** 3
+
+    def __init__(self, manifest_path, shared_paths=()):
+        self.manifest_path = manifest_path
+        self.shared_paths = list(shared_paths)
+        self.completed = np.memmap(manifest_path, dtype=np.uint8, mode="r+", shape=(self.num_colors,))
+        # Colors marked in any of the shared manifests count as finished, they are never written
+        self.shared = []
+        for path in self.shared_paths:
+            try:
+                self.shared.append(np.memmap(path, dtype=np.uint8, mode="r", shape=(self.num_colors,)))
+            except FileNotFoundError:
+                pass  # Discarded by a verifying machine since it was listed
+
+    @staticmethod
+    def get_path(color_folder, output_format):
+        return os.path.join(color_folder, f".completed_{output_format}.bitmap")
+
+    @staticmethod
+    def get_owner_folder(color_folder, output_format):
+        return os.path.join(color_folder, f".completed_{output_format}")
+
+    @classmethod
+    def get_owner_path(cls, color_folder, output_format, owner):
+        return os.path.join(cls.get_owner_folder(color_folder, output_format), re.sub(r"[^\w.-]", "_", owner) + ".bitmap")
+
+    @classmethod
+    def open(cls, color_folder, output_format, verify=False, owner=None):
+        """
+        Opens the manifest of the color folder. It is rebuilt from a single directory scan
+        if it does not exist yet (e.g. output of an older version) or if verify is set.
+        The manifests of the machines of a distributed run are read as well.
+        With owner, the manifest of that machine is opened for writing and the shared one is only read.
+        """
+        manifest_path = cls.get_path(color_folder, output_format)
+        if verify:
+            cls.verify(color_folder, output_format)
+        elif not os.path.exists(manifest_path):
+            cls.rebuild(color_folder, output_format)
+
+        owner_folder = cls.get_owner_folder(color_folder, output_format)
+        owner_paths = []
+        if os.path.isdir(owner_folder):
+            owner_paths = sorted(entry.path for entry in os.scandir(owner_folder) if entry.name.endswith(".bitmap"))
+        if owner is None:
+            return cls(manifest_path, owner_paths)
+
+        own_path = cls.get_owner_path(color_folder, output_format, owner)
+        if not os.path.exists(own_path):
+            os.makedirs(owner_folder, exist_ok=True)
+            cls.create_empty(own_path)
+        return cls(own_path, [manifest_path] + [path for path in owner_paths if path != own_path])
+
+    @classmethod
+    def create_empty(cls, manifest_path):
+        # Created under a temporary name at its full size, so readers never map a short file. It is
+        # linked into place, the processes of a host share their manifest and must not replace it
+        temp_fd, temp_path = tempfile.mkstemp(prefix=".completed_", suffix=".tmp", dir=os.path.dirname(manifest_path))
+        os.close(temp_fd)
+        completed = np.memmap(temp_path, dtype=np.uint8, mode="w+", shape=(cls.num_colors,))
+        completed.flush()
+        del completed
+        os.chmod(temp_path, SHARED_FILE_MODE)
+        try:
+            os.link(temp_path, manifest_path)
+        except FileExistsError:
+            pass  # Created by another process of this host
+        finally:
+            os.remove(temp_path)
+
+    @classmethod
+    def rebuild(cls, color_folder, output_format):
+        manifest_path = cls.get_path(color_folder, output_format)
+        logging.info(f"Rebuilding completion manifest {manifest_path}.")
+        # Unique temporary name, several processes or machines may rebuild at the same time
+        temp_fd, temp_path = tempfile.mkstemp(prefix=".completed_", suffix=".tmp", dir=color_folder)
+        os.close(temp_fd)
+        completed = np.memmap(temp_path, dtype=np.uint8, mode="w+", shape=(cls.num_colors,))
+        for color_indices in IMAGE_WRITERS[output_format].scan_completed(color_folder):
+            completed[np.asarray(color_indices, dtype=np.int64)] = 1
+        completed.flush()
+        num_completed = int(np.count_nonzero(completed))
+        del completed
+        os.chmod(temp_path, SHARED_FILE_MODE)
+        os.replace(temp_path, manifest_path)
+        logging.info(f"Completion manifest rebuilt, {num_completed} images found.")
+
+    @classmethod
+    def verify(cls, color_folder, output_format, keep_paths=()):
+        """
+        Rebuilds the manifest from the files on disk and discards the machine manifests, so marks of
+        deleted images do not survive in them. keep_paths are the manifests of live machines.
+        """
+        cls.rebuild(color_folder, output_format)
+        owner_folder = cls.get_owner_folder(color_folder, output_format)
+        if os.path.isdir(owner_folder):
+            for entry in os.scandir(owner_folder):
+                if entry.name.endswith(".bitmap") and entry.path not in keep_paths:
+                    os.remove(entry.path)
+                    logging.info(f"Discarded machine manifest {entry.path}.")
+
+    def lookup(self, key):
+        completed = self.completed[key] != 0
+        for shared in self.shared:
+            completed |= shared[key] != 0
+        return completed
+
+    def completed_mask(self, start_idx, end_idx):
+        """
+        Returns a bool array telling which colors of start_idx..end_idx (end exclusive) are finished.
+        """
+        return self.lookup(slice(start_idx, end_idx))
+
+    def completed_at(self, color_indices):
+        """
+        Returns a bool array telling which of the given colors are finished.
+        """
+        return self.lookup(color_indices)
+
+    def mark(self, color_indices):
+        self.completed[color_indices] = 1
+
+    def flush(self):
+        self.completed.flush()
+
+# Directory layouts of the png output, recorded in the .layout file of the color folder
+FOLDER_LAYOUTS = ("flat", "prefix", "hashed")
+
+class FolderLayout:
+    """
+    Maps a hex color to the path of its image below the color folder, so readers can find any
+    image without listing directories. "flat" puts every file into the color folder, "prefix"
+    nests it in directories named after the leading hex digit pairs (FF/A0/FFA0C3.png with
+    depth 2) and "hashed" in directories named after a CRC32 of the name, which also spreads
+    skewed color sets evenly. Every level bounds a directory to 256 entries.
+    """
+    file_name = ".layout"
+
+    def __init__(self, kind="flat", depth=2):
+        if kind not in FOLDER_LAYOUTS:
+            raise ValueError(f"Unknown folder layout: {kind}")
+        if kind != "flat" and not 1 <= depth <= 3:
+            raise ValueError(f"Folder layout depth must be between 1 and 3: {depth}")
+        self.kind = kind
+        self.depth = depth if kind != "flat" else 0
+
+    @classmethod
+    def parse(cls, spec):
+        """
+        Parses a layout like "flat", "prefix", "prefix:1" or "hashed:3" (the number is the depth).
+        """
+        kind, _, depth = spec.partition(":")
+        return cls(kind, int(depth) if depth else 2)
+
+    def __str__(self):
+        return self.kind if self.kind == "flat" else f"{self.kind}:{self.depth}"
+
+    def __eq__(self, other):
+        return isinstance(other, FolderLayout) and str(self) == str(other)
+
+    def directories(self, hex_color):
+        digits = hex_color if self.kind == "prefix" else f"{zlib.crc32(hex_color.encode()):08X}"
+        return [digits[2 * level:2 * level + 2] for level in range(self.depth)]
+
+    def relative_path(self, hex_color, suffix=".png"):
+        return os.path.join(*self.directories(hex_color), f"{hex_color}{suffix}")
+
+    @classmethod
+    def load(cls, color_folder):
+        """
+        Returns the recorded layout of the color folder, folders without a .layout file are flat.
+        """
+        try:
+            with open(os.path.join(color_folder, cls.file_name)) as layout_file:
+                return cls.parse(layout_file.read().strip())
+        except FileNotFoundError:
+            return cls()
+
+    def save(self, color_folder):
+        temp_fd, temp_path = tempfile.mkstemp(prefix=".layout_", suffix=".tmp", dir=color_folder)
+        with os.fdopen(temp_fd, "w") as layout_file:
+            layout_file.write(f"{self}\n")
+        # Readers like find_image_path may run under another account
+        os.chmod(temp_path, SHARED_FILE_MODE)
+        os.replace(temp_path, os.path.join(color_folder, self.file_name))
+
+    @classmethod
+    def open(cls, color_folder, layout):
+        """
+        Checks the requested layout against the one of the color folder and records it for a new
+        folder. A folder that already holds images in another layout has to be migrated first.
+        """
+        if os.path.exists(os.path.join(color_folder, cls.file_name)):
+            existing_layout = cls.load(color_folder)
+        elif any(PngFolderWriter.iter_image_paths(color_folder, recursive=False)):
+            existing_layout = cls()
+        else:
+            layout.save(color_folder)
+            return layout
+        if existing_layout != layout:
+            raise ValueError(f"{color_folder} uses the {existing_layout} layout, migrate it to {layout} first")
+        return layout
+
+def color_to_hex(color):
+    """
+    Returns the hex name of a color given as hex string, color index or (r, g, b) tuple.
+    """
+    if isinstance(color, str):
+        return color.lstrip("#").upper()
+    if isinstance(color, (int, np.integer)):
+        return color_index_to_hex(int(color))
+    return "".join(f"{channel:02X}" for channel in color)
+
+def find_image_path(color_folder, color, layout=None):
+    """
+    Returns the path of the png image of a color in the color folder without listing any
+    directory. Pass the FolderLayout.load(color_folder) result as layout when looking up many colors.
+    """
+    layout = layout or FolderLayout.load(color_folder)
+    return os.path.join(color_folder, layout.relative_path(color_to_hex(color)))
+
+def migrate_folder_layout(color_folder, layout):
+    """
+    Moves the png images of a color folder into another layout with renames (no copies) and records
+    it. An interrupted migration can simply be run again, images are found in any layout.
+    The folder is streamed, memory stays bounded by the images of one top-level directory.
+    Returns the number of moved images.
+    """
+    created_directories = set()
+    new_top_directories = set()
+    moved = 0
+
+    def move_image(path):
+        nonlocal moved
+        hex_color = os.path.basename(path)[:6]
+        target_path = os.path.join(color_folder, layout.relative_path(hex_color))
+        if path == target_path:
+            return
+        target_directory = os.path.dirname(target_path)
+        if target_directory not in created_directories:
+            directories = layout.directories(hex_color)
+            top_directory = os.path.join(color_folder, directories[0]) if directories else None
+            if top_directory is not None and not os.path.isdir(top_directory):
+                new_top_directories.add(top_directory)
+            os.makedirs(target_directory, exist_ok=True)
+            created_directories.add(target_directory)
+        os.replace(path, target_path)
+        moved += 1
+        if moved % 100000 == 0:
+            logging.info(f"Migrated {moved} images.")
+
+    # Top-level images are moved while the folder is streamed, only the directories of the old
+    # layout are remembered; directories created by the migration are never entered again
+    old_directories = []
+    with os.scandir(color_folder) as entries:
+        for entry in entries:
+            if entry.name.startswith("."):
+                continue
+            if entry.is_dir(follow_symlinks=False):
+                if entry.path not in new_top_directories:
+                    old_directories.append(entry.path)
+            elif re.fullmatch(r"[0-9A-F]{6}\.png", entry.name):
+                move_image(entry.path)
+
+    # A top-level directory of a nested layout holds at most 1/256 of the images, its paths are
+    # listed before they are moved, so the directories created meanwhile are not walked
+    for old_directory in old_directories:
+        for path in list(PngFolderWriter.iter_image_paths(old_directory)):
+            move_image(path)
+    layout.save(color_folder)
+
+    # Remove the directories of the old layout that are empty now
+    for old_directory in old_directories:
+        for directory, _, _ in os.walk(old_directory, topdown=False):
+            with os.scandir(directory) as entries:
+                is_empty = next(entries, None) is None
+            if is_empty:
+                os.rmdir(directory)
+    logging.info(f"Migrated {moved} images of {color_folder} to the {layout} layout.")
+    return moved
+
+class ImageWriter:
+    """
+    Base class for the output writers. Writing is split into encode() / encode_solid_color(),
+    which may run in any thread, and write_encoded(), which stores the encoded image and marks
+    it in the completion manifest. Images are PNG-encoded unless a writer overrides the encoders.
+    Writers that store raw pixels set stores_pixels, their solid color images are rendered in batches.
+    """
+    stores_pixels = False
+
+    def __init__(self, color_folder, manifest, shard_size=DEFAULT_SHARD_SIZE, compress_level=DEFAULT_PNG_COMPRESS_LEVEL, layout=None):
+        self.color_folder = color_folder
+        self.manifest = manifest
+        self.compress_level = compress_level
+        self.layout = layout or FolderLayout()
+
+    def encode(self, pixels):
+        return encode_png(pixels, self.compress_level)
+
+    def encode_solid_color(self, color, image_width, image_height):
+        return get_solid_color_png_encoder(image_width, image_height, self.compress_level).encode(color)
+
+    def write_encoded(self, color_index, hex_color, data):
+        raise NotImplementedError
+
+    def close(self):
+        self.manifest.flush()
+
+class PngFolderWriter(ImageWriter):
+    """
+    Writes one <HEX>.png file per color into the color folder, placed by the folder layout.
+    """
+    def __init__(self, color_folder, manifest, shard_size=DEFAULT_SHARD_SIZE, compress_level=DEFAULT_PNG_COMPRESS_LEVEL, layout=None):
+        super().__init__(color_folder, manifest, shard_size, compress_level, layout)
+        self.created_directories = set()
+
+    @staticmethod
+    def iter_image_paths(folder, recursive=True):
+        """
+        Yields the paths of the <HEX>.png images below folder in any layout (hidden entries are skipped).
+        """
+        for entry in os.scandir(folder):
+            if entry.name.startswith("."):
+                continue
+            if recursive and entry.is_dir(follow_symlinks=False):
+                yield from PngFolderWriter.iter_image_paths(entry.path)
+            elif re.fullmatch(r"[0-9A-F]{6}\.png", entry.name):
+                yield entry.path
+
+    @staticmethod
+    def scan_completed(color_folder):
+        yield [hex_to_color_index(os.path.basename(path)[:6]) for path in PngFolderWriter.iter_image_paths(color_folder)]
+
+    def write_encoded(self, color_index, hex_color, data):
+        path = os.path.join(self.color_folder, self.layout.relative_path(hex_color))
+        directory = os.path.dirname(path)
+        if directory not in self.created_directories:
+            os.makedirs(directory, exist_ok=True)
+            self.created_directories.add(directory)
+        with open(path, "wb") as f:
+            f.write(data)
+        self.manifest.mark(color_index)
+
+class ShardWriter(ImageWriter):
+    """
+    Base class for the packed writers. Images are buffered and written as shards of
+    shard_size images each, so a full run produces a few thousand files instead of millions.
+    Shards are named after the first color index they contain, so several writers (threads or
+    worker processes) can write into the same folder without coordinating shard numbers.
+    Shards are written to a temporary file first and renamed, so a shard is either complete or missing.
+    """
+    shard_suffix = None
+
+    def __init__(self, color_folder, manifest, shard_size=DEFAULT_SHARD_SIZE, compress_level=DEFAULT_PNG_COMPRESS_LEVEL, layout=None):
+        super().__init__(color_folder, manifest, shard_size, compress_level, layout)
+        self.shard_size = max(1, shard_size)
+        self.lock = threading.Lock()
+        self.buffer = []
+
+    @classmethod
+    def scan_completed(cls, color_folder):
+        for entry in os.scandir(color_folder):
+            if re.fullmatch(r"shard_\d+" + re.escape(cls.shard_suffix), entry.name):
+                yield cls.read_shard_colors(entry.path)
+
+    def write_encoded(self, color_index, hex_color, data):
+        with self.lock:
+            self.buffer.append((color_index, hex_color, data))
+            if len(self.buffer) < self.shard_size:
+                return
+            entries, self.buffer = self.buffer, []
+        self.flush(entries)
+
+    def close(self):
+        with self.lock:
+            entries, self.buffer = self.buffer, []
+        if entries:
+            self.flush(entries)
+        self.manifest.flush()
+
+    def flush(self, entries):
+        # A color is only ever written to one shard, so its first color index is a unique name
+        first_color_index = min(color_index for color_index, _, _ in entries)
+        shard_path = os.path.join(self.color_folder, f"shard_{first_color_index:08d}{self.shard_suffix}")
+        temp_path = shard_path + ".tmp"
+        self.write_shard(temp_path, entries)
+        os.replace(temp_path, shard_path)
+        self.manifest.mark([color_index for color_index, _, _ in entries])
+        logging.info(f"Wrote shard {shard_path} with {len(entries)} images.")
+
+    @staticmethod
+    def read_shard_colors(shard_path):
+        raise NotImplementedError
+
+    def write_shard(self, shard_path, entries):
+        raise NotImplementedError
+
+class NpyShardWriter(ShardWriter):
+    """
+    Writes shard_XXXXXXXX.npy files holding an (N, H, W, 3) uint8 array each, plus a
+    shard_XXXXXXXX.colors.npy index with the color index of every image.
+    The image arrays can be opened zero-copy with np.load(path, mmap_mode="r").
+    """
+    shard_suffix = ".npy"
+    stores_pixels = True
+
+    # The shards hold the raw pixels
+    def encode(self, pixels):
+        return pixels
+
+    def encode_solid_color(self, color, image_width, image_height):
+        return np.full((image_height, image_width, 3), color, dtype=np.uint8)
+
+    @staticmethod
+    def read_shard_colors(shard_path):
+        return np.load(NpyShardWriter.colors_path(shard_path))
+
+    @staticmethod
+    def colors_path(shard_path):
+        return shard_path[:-len(".npy")] + ".colors.npy"
+
+    def write_shard(self, shard_path, entries):
+        colors = np.array([color_index for color_index, _, _ in entries], dtype=np.uint32)
+        images = np.stack([pixels for _, _, pixels in entries])
+        # The color index is written first, a shard without its index is never renamed into place
+        with open(self.colors_path(shard_path[:-len(".tmp")]), "wb") as f:
+            np.save(f, colors)
+        with open(shard_path, "wb") as f:
+            np.save(f, images)
+
+class TarShardWriter(ShardWriter):
+    """
+    Writes WebDataset-style shard_XXXXXXXX.tar files with one <HEX>.png member per image.
+    The images are PNG-encoded before they are buffered, the buffer holds the encoded bytes.
+    """
+    shard_suffix = ".tar"
+
+    @staticmethod
+    def read_shard_colors(shard_path):
+        with tarfile.open(shard_path) as tar:
+            return [hex_to_color_index(name[:-len(".png")]) for name in tar.getnames() if name.endswith(".png")]
+
+    def write_shard(self, shard_path, entries):
+        with tarfile.open(shard_path, "w") as tar:
+            for _, hex_color, data in entries:
+                info = tarfile.TarInfo(f"{hex_color}.png")
+                info.size = len(data)
+                info.mtime = int(time.time())
+                tar.addfile(info, io.BytesIO(data))
+
+IMAGE_WRITERS = {"png": PngFolderWriter, "npy": NpyShardWriter, "tar": TarShardWriter}
+
+def create_image_writer(output_format, color_folder, manifest, shard_size=DEFAULT_SHARD_SIZE, compress_level=DEFAULT_PNG_COMPRESS_LEVEL, layout=None):
+    """
+    Returns the writer for the selected output format. The folder layout only applies to png output.
+    """
+    if output_format not in IMAGE_WRITERS:
+        raise ValueError(f"Unknown output format: {output_format}")
+    return IMAGE_WRITERS[output_format](color_folder, manifest, shard_size, compress_level, layout)
+
+# Generation backends
+GENERATION_BACKENDS = ("process", "thread")
+
+# Color sources: ordered, lazily generated sequences of color indices
+COLOR_SOURCE_BATCH_SIZE = 1 << 20  # Positions looked up at once when scanning the completion manifest
+COLOR_SOURCE_KINDS = ("range", "lattice", "file")
+
+class ColorSource:
+    """
+    An ordered sequence of color indices (r + g * 256 + b * 65536). Subclasses implement __len__
+    and color_indices_at(positions) for an int64 array of positions; the sequence is only ever
+    generated one batch at a time, so memory stays O(1) in its length.
+    """
+    def __len__(self):
+        raise NotImplementedError
+
+    def color_indices_at(self, positions):
+        raise NotImplementedError
+
+    def color_indices(self, start, end):
+        """
+        Returns the color indices of the positions start..end (end exclusive).
+        """
+        return self.color_indices_at(np.arange(start, end, dtype=np.int64))
+
+    def missing_ranges(self, manifests):
+        """
+        Scans the source against the completion manifests (one per output target) in batches.
+        A color is missing while any manifest lacks it. Returns the number of finished images
+        outside the missing ranges and the contiguous (start, end) position ranges (end exclusive).
+        """
+        num_completed = 0
+        ranges = []
+        for batch_start in range(0, len(self), COLOR_SOURCE_BATCH_SIZE):
+            batch_end = min(batch_start + COLOR_SOURCE_BATCH_SIZE, len(self))
+            color_indices = self.color_indices(batch_start, batch_end)
+            completed = np.logical_and.reduce([manifest.completed_at(color_indices) for manifest in manifests])
+            num_completed += int(np.count_nonzero(completed)) * len(manifests)
+            missing = np.concatenate(([False], ~completed, [False]))
+            edges = np.flatnonzero(np.diff(missing.astype(np.int8)))
+            for i in range(0, len(edges), 2):
+                start, end = batch_start + int(edges[i]), batch_start + int(edges[i + 1])
+                # Join the ranges that continue across a batch boundary
+                if ranges and ranges[-1][1] == start:
+                    ranges[-1] = (ranges[-1][0], end)
+                else:
+                    ranges.append((start, end))
+        return num_completed, ranges
+
+class RangeColorSource(ColorSource):
+    """
+    The contiguous color indices start..end (end exclusive), optionally every stride-th one.
+    """
+    def __init__(self, start, end, stride=1):
+        if not 0 <= start <= end <= CompletionManifest.num_colors:
+            raise ValueError(f"Invalid color range: {start}-{end}")
+        if stride < 1:
+            raise ValueError(f"Stride must be at least 1: {stride}")
+        self.start, self.end, self.stride = start, end, stride
+
+    def __len__(self):
+        return -(-(self.end - self.start) // self.stride)
+
+    def __repr__(self):
+        return f"range {self.start}-{self.end - 1}" + (f" stride {self.stride}" if self.stride > 1 else "")
+
+    def color_indices_at(self, positions):
+        return self.start + positions * self.stride
+
+class LatticeColorSource(ColorSource):
+    """
+    The quantized color cube with every step-th level per channel (0, step, 2 * step, ...),
+    red changing fastest.
+    """
+    def __init__(self, step):
+        if not 1 <= step <= 256:
+            raise ValueError(f"Lattice step must be between 1 and 256: {step}")
+        self.step = step
+        self.levels = -(-256 // step)
+
+    def __len__(self):
+        return self.levels ** 3
+
+    def __repr__(self):
+        return f"lattice step {self.step} ({self.levels} levels per channel)"
+
+    def color_indices_at(self, positions):
+        r = positions % self.levels
+        g = positions // self.levels % self.levels
+        b = positions // (self.levels * self.levels)
+        return (r + g * 256 + b * 65536) * self.step
+
+class ListColorSource(ColorSource):
+    """
+    An explicit list of colors, e.g. a palette. Duplicates are dropped, the first occurrence keeps its position.
+    """
+    def __init__(self, color_indices, name="list"):
+        color_indices = np.asarray(color_indices, dtype=np.int64).reshape(-1)
+        if len(color_indices) and not (0 <= color_indices.min() and color_indices.max() < CompletionManifest.num_colors):
+            raise ValueError(f"Color index out of range in {name}")
+        _, first_positions = np.unique(color_indices, return_index=True)
+        self.indices = color_indices[np.sort(first_positions)]
+        self.name = name
+
+    @classmethod
+    def from_file(cls, path):
+        """
+        Reads a palette with one color per line, either as hex (RRGGBB, #RRGGBB or 0xRRGGBB)
+        or as CSV r,g,b values. Empty lines and a CSV header line are ignored.
+        """
+        color_indices = []
+        with open(path, newline="") as palette_file:
+            for line_number, line in enumerate(palette_file, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                match = re.fullmatch(r"(?:#|0x)?([0-9A-Fa-f]{6})", line)
+                if match:
+                    color_indices.append(hex_to_color_index(match.group(1)))
+                    continue
+                fields = [field.strip() for field in re.split(r"[,;\t ]+", line) if field.strip()]
+                if len(fields) >= 3 and all(field.isdigit() for field in fields[:3]):
+                    r, g, b = (int(field) for field in fields[:3])
+                    if max(r, g, b) > 255:
+                        raise ValueError(f"{path}:{line_number}: channel value out of range: {line}")
+                    color_indices.append(r + g * 256 + b * 65536)
+                elif color_indices or line_number > 1:
+                    raise ValueError(f"{path}:{line_number}: not a color: {line}")
+        return cls(color_indices, os.path.basename(path))
+
+    def __len__(self):
+        return len(self.indices)
+
+    def __repr__(self):
+        return f"{self.name} ({len(self.indices)} colors)"
+
+    def color_indices_at(self, positions):
+        return self.indices[positions]
+
+class ShuffledColorSource(ColorSource):
+    """
+    A seeded pseudo-random permutation of another source. Positions are mapped through a Feistel
+    network over the next power of two, cycle walking keeps them below the length, so no
+    permutation table is stored.
+    """
+    rounds = 4
+
+    def __init__(self, source, seed):
+        self.source = source
+        self.seed = seed
+        bits = max(2, (len(source) - 1).bit_length())
+        self.half_bits = np.uint64((bits + 1) // 2)
+        self.half_mask = np.uint64((1 << int(self.half_bits)) - 1)
+        self.keys = np.random.default_rng(seed).integers(0, 1 << 63, size=self.rounds, dtype=np.uint64)
+
+    def __len__(self):
+        return len(self.source)
+
+    def __repr__(self):
+        return f"{self.source!r} shuffled with seed {self.seed}"
+
+    @staticmethod
+    def mix(x):
+        # splitmix64 finalizer, wraps around modulo 2 ** 64
+        x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        return x ^ (x >> np.uint64(31))
+
+    def permute(self, positions):
+        left, right = positions >> self.half_bits, positions & self.half_mask
+        for key in self.keys:
+            left, right = right, left ^ (self.mix(right ^ key) & self.half_mask)
+        return (left << self.half_bits) | right
+
+    def color_indices_at(self, positions):
+        length = np.uint64(len(self))
+        permuted = self.permute(np.asarray(positions, dtype=np.uint64))
+        outside = permuted >= length
+        while outside.any():
+            permuted[outside] = self.permute(permuted[outside])
+            outside = permuted >= length
+        return self.source.color_indices_at(permuted.astype(np.int64))
+
+class SliceColorSource(ColorSource):
+    """
+    The positions start..end (end exclusive) of another source, e.g. the first colors of a
+    shuffled source as a random sample, or one shard of a distributed run.
+    """
+    def __init__(self, source, start, end):
+        self.source = source
+        self.end = min(max(0, end), len(source))
+        self.start = min(max(0, start), self.end)
+
+    def __len__(self):
+        return self.end - self.start
+
+    def __repr__(self):
+        return f"positions {self.start}-{self.end - 1} of {self.source!r}"
+
+    def color_indices_at(self, positions):
+        return self.source.color_indices_at(positions + self.start)
+
+def create_color_source(kind="range", start=0, end=CompletionManifest.num_colors, stride=1, lattice_step=4, palette_path=None, shuffle_seed=None, count=None):
+    """
+    Builds a color source: "range" (start..end, end exclusive, every stride-th color), "lattice"
+    (every lattice_step-th level per channel) or "file" (palette or CSV list at palette_path).
+    shuffle_seed permutes the colors, count keeps only the first count of them.
+    """
+    if kind == "range":
+        source = RangeColorSource(start, end, stride)
+    elif kind == "lattice":
+        source = LatticeColorSource(lattice_step)
+    elif kind == "file":
+        if not palette_path:
+            raise ValueError("The file color source needs a palette path")
+        source = ListColorSource.from_file(palette_path)
+    else:
+        raise ValueError(f"Unknown color source: {kind}")
+
+    if shuffle_seed is not None:
+        source = ShuffledColorSource(source, shuffle_seed)
+    if count is not None:
+        source = SliceColorSource(source, 0, count)
+    return source
+
+# Progress metrics
+PROGRESS_INTERVAL = 0.1  # Seconds between progress reports (10 Hz)
+
+class ProgressCounters:
+    """
+    Generated / skipped counters with one slot per thread. A thread only ever writes its own
+    slot, so counting in the hot loop needs no lock; readers sum the slots.
+    """
+    def __init__(self):
+        self.slots = {}
+
+    def add(self, generated, skipped):
+        slot = self.slots.get(threading.get_ident())
+        if slot is None:
+            slot = self.slots.setdefault(threading.get_ident(), [0, 0])
+        slot[0] += generated
+        slot[1] += skipped
+
+    def totals(self):
+        slots = list(self.slots.values())
+        return sum(slot[0] for slot in slots), sum(slot[1] for slot in slots)
+
+class SharedProgressCounters:
+    """
+    Generated / skipped counters of the worker processes in shared memory. Every worker
+    publishes its totals into its own pair of slots, the parent sums them.
+    """
+    def __init__(self, context, num_workers):
+        self.values = context.RawArray("q", 2 * max(1, num_workers))
+
+    def totals(self):
+        return sum(self.values[0::2]), sum(self.values[1::2])
+
+class ProgressReporter:
+    """
+    Reports the progress from its own thread at a fixed rate, decoupled from the image loop.
+    progress_callback is called as progress_callback(images_generated, total_images, estimated_time,
+    images_per_second, skipped_images, elapsed_time) with the totals returned by read_totals().
+    """
+    def __init__(self, read_totals, total_images, progress_callback, already_skipped=0, interval=PROGRESS_INTERVAL):
+        self.read_totals = read_totals
+        self.total_images = total_images
+        self.progress_callback = progress_callback
+        self.already_skipped = already_skipped
+        self.interval = interval
+        self.start_time = time.time()
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def start(self):
+        if self.progress_callback is not None:
+            self.thread.start()
+
+    def stop(self):
+        """
+        Stops the reporter thread and sends a final report.
+        """
+        if self.thread.is_alive():
+            self.stop_event.set()
+            self.thread.join()
+            self.report()
+
+    def run(self):
+        while not self.stop_event.wait(self.interval):
+            self.report()
+
+    def report(self):
+        images_generated, skipped_images = self.read_totals()
+        skipped_images += self.already_skipped
+        if images_generated > 0:
+            elapsed_time = time.time() - self.start_time
+            estimated_time = (elapsed_time / images_generated) * (self.total_images - images_generated)
+
+            images_per_second = images_generated / elapsed_time if elapsed_time > 0 else 0
+
+            try:
+                self.progress_callback(images_generated, self.total_images, estimated_time, images_per_second, skipped_images, elapsed_time)
+            except Exception as e:
+                logging.error(f"Error in progress callback: {e}")
+
+# Opt-in profiling of the pipeline stages
+PYTHON_PROFILERS = ("cprofile", "sampling")
+PROFILE_SAMPLING_INTERVAL = 0.005  # Seconds between stack samples of the sampling profiler
+PROFILE_HISTOGRAM_BUCKETS = 24  # Powers of two from 1 µs up to about 8 s
+
+class StageProfiler:
+    """
+    Records the spans of the pipeline stages of one worker: (stage, start, duration, thread name, images)
+    with perf_counter timestamps, which share one clock across the processes of a machine.
+    A pipeline only calls it when profiling is enabled, so a disabled run pays one None check
+    per chunk. python_profiler ("cprofile" or "sampling") additionally profiles the Python code
+    of every thread that runs through run().
+    """
+    def __init__(self, worker_idx=0, python_profiler=None):
+        if python_profiler not in (None,) + PYTHON_PROFILERS:
+            raise ValueError(f"Unknown python profiler: {python_profiler}")
+        self.worker_idx = worker_idx
+        self.python_profiler = python_profiler
+        self.events = []
+        self.cprofiles = []
+        self.sampler = None
+
+    def record(self, stage_name, start, end, images=0):
+        # list.append is atomic, every stage thread records without a lock
+        self.events.append((stage_name, start, end - start, threading.current_thread().name, images))
+
+    def run(self, function, *args):
+        """
+        Calls function(*args) under the python profiler. The first call starts the sampling profiler,
+        which covers all threads; cProfile needs one profile per thread.
+        """
+        if self.python_profiler == "sampling" and self.sampler is None:
+            self.sampler = SamplingProfiler()
+            with self.sampler:
+                return function(*args)
+        if self.python_profiler != "cprofile":
+            return function(*args)
+
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Python 3.12+ profiles all threads with the profile that is already enabled
+            return function(*args)
+        self.cprofiles.append(profile)
+        try:
+            return function(*args)
+        finally:
+            profile.disable()
+
+    def dump_python_profile(self, profile_dir):
+        """
+        Writes the cProfile statistics of this process to profile_dir/python_<pid>_<worker>.prof,
+        write_profile merges the files of all processes.
+        """
+        if self.cprofiles:
+            pstats.Stats(*self.cprofiles).dump_stats(os.path.join(profile_dir, f"python_{os.getpid()}_{self.worker_idx}.prof"))
+
+    def export(self):
+        """
+        Returns the recordings as a picklable dict, to be passed from worker processes to the parent.
+        """
+        return {
+            "worker": self.worker_idx,
+            "pid": os.getpid(),
+            "events": self.events,
+            "samples": None if self.sampler is None else self.sampler.counts,
+        }
+
+class SamplingProfiler:
+    """
+    Samples the stacks of all other threads of this process every interval seconds and counts them
+    in collapsed form ("thread;outer;inner"), as read by flamegraph.pl and speedscope.
+    Used as a context manager around a pipeline run.
+    """
+    def __init__(self, interval=PROFILE_SAMPLING_INTERVAL):
+        self.interval = interval
+        self.counts = {}
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self.run, name="sampling-profiler", daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop_event.set()
+        self.thread.join()
+
+    def run(self):
+        own_ident = threading.get_ident()
+        while not self.stop_event.wait(self.interval):
+            thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own_ident:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(f"{frame.f_code.co_name} ({os.path.basename(frame.f_code.co_filename)}:{frame.f_code.co_firstlineno})")
+                    frame = frame.f_back
+                key = ";".join([thread_names.get(ident, str(ident))] + stack[::-1])
+                self.counts[key] = self.counts.get(key, 0) + 1
+
+def summarize_profile_events(events):
+    """
+    Cumulative time, span count, images and a log2 histogram of the span durations per stage.
+    Histogram bucket i counts the spans shorter than 2 ** i µs (the last one the rest).
+    """
+    stages = {}
+    for stage_name, _, duration, _, images in events:
+        stage = stages.get(stage_name)
+        if stage is None:
+            stage = stages[stage_name] = {"spans": 0, "total_seconds": 0.0, "max_seconds": 0.0, "images": 0, "histogram_us": [0] * PROFILE_HISTOGRAM_BUCKETS}
+        stage["spans"] += 1
+        stage["total_seconds"] += duration
+        stage["max_seconds"] = max(stage["max_seconds"], duration)
+        stage["images"] += images
+        bucket = min(PROFILE_HISTOGRAM_BUCKETS - 1, max(0, int(duration * 1e6)).bit_length())
+        stage["histogram_us"][bucket] += 1
+    for stage in stages.values():
+        stage["mean_seconds"] = stage["total_seconds"] / stage["spans"]
+    return stages
+
+def write_profile(profile_dir, profiles):
+    """
+    Writes the exported StageProfiler recordings of all processes to profile_dir: profile.json
+    (per-stage summary overall and per worker), trace.json (Chrome trace, open it in
+    chrome://tracing or Perfetto) and the python profiles of the workers, merged into python.prof
+    (cProfile, read it with pstats or snakeviz) or python.collapsed (sampling profiler).
+    Returns the paths of the written files.
+    """
+    os.makedirs(profile_dir, exist_ok=True)
+    paths = {}
+    all_events = [event for profile in profiles for event in profile["events"]]
+    report = {
+        "stages": summarize_profile_events(all_events),
+        "workers": [{"worker": profile["worker"], "pid": profile["pid"], "stages": summarize_profile_events(profile["events"])} for profile in profiles],
+        "histogram_buckets_us": [2 ** bucket for bucket in range(PROFILE_HISTOGRAM_BUCKETS)],
+    }
+    paths["summary"] = os.path.join(profile_dir, "profile.json")
+    with open(paths["summary"], "w") as f:
+        json.dump(report, f, indent=2)
+
+    # Chrome trace: one complete ("X") event per span, timestamps in µs from the first span
+    start_time = min((event[1] for event in all_events), default=0.0)
+    trace_events = []
+    for profile in profiles:
+        trace_events.append({"name": "process_name", "ph": "M", "pid": profile["pid"], "args": {"name": f"worker {profile['worker']}"}})
+        thread_ids = {}
+        for stage_name, start, duration, thread_name, images in profile["events"]:
+            if thread_name not in thread_ids:
+                thread_ids[thread_name] = len(thread_ids)
+                trace_events.append({"name": "thread_name", "ph": "M", "pid": profile["pid"], "tid": thread_ids[thread_name], "args": {"name": thread_name}})
+            trace_events.append({"name": stage_name, "ph": "X", "pid": profile["pid"], "tid": thread_ids[thread_name], "ts": round((start - start_time) * 1e6, 1),
+                                 "dur": round(duration * 1e6, 1), "args": {"images": images}})
+    paths["trace"] = os.path.join(profile_dir, "trace.json")
+    with open(paths["trace"], "w") as f:
+        json.dump({"traceEvents": trace_events, "displayTimeUnit": "ms"}, f)
+
+    cprofile_paths = [os.path.join(profile_dir, name) for name in sorted(os.listdir(profile_dir)) if re.fullmatch(r"python_\d+_\d+\.prof", name)]
+    if cprofile_paths:
+        paths["python"] = os.path.join(profile_dir, "python.prof")
+        pstats.Stats(*cprofile_paths).dump_stats(paths["python"])
+        for path in cprofile_paths:
+            os.remove(path)
+
+    samples = {}
+    for profile in profiles:
+        for stack, count in (profile["samples"] or {}).items():
+            samples[stack] = samples.get(stack, 0) + count
+    if samples:
+        paths["python"] = os.path.join(profile_dir, "python.collapsed")
+        with open(paths["python"], "w") as f:
+            for stack, count in sorted(samples.items()):
+                f.write(f"{stack} {count}\n")
+
+    logging.info(f"Profile written to {profile_dir}.")
+    return paths
+
+# Staged generation pipeline
+PIPELINE_QUEUE_SIZE = 4  # Chunks buffered between two stages
+PIPELINE_CHUNK_SIZE = 256  # Images per chunk handed to the encode and write stages
+PIPELINE_RENDER_CHUNK_SIZE = 4096  # Maximum mandala images rendered in one call
+PIPELINE_WRITE_THREADS = 4
+PIPELINE_STATS_INTERVAL = 5.0  # Seconds between queue depth log lines
+
+class GenerationPipeline:
+    """
+    Bounded producer/consumer pipeline feeding one writer per output target:
+    colors (calling thread) -> render -> encode -> write.
+    Every stage runs in its own threads and passes chunks of images to the next stage through
+    a bounded queue, so memory stays flat for any range size and rendering, encoding and disk
+    I/O overlap (zlib, numpy and file writes release the GIL). A full queue blocks the stage
+    before it; the queue depths are logged to show which stage is the bottleneck.
+    Batch and chunk sizes come from a BatchSizePlanner and are adapted between batches.
+    Ranges and batches are positions in settings["color_source"], which maps them to colors.
+    All targets of settings["targets"] are rendered in the same sweep, so enumeration, completion
+    checks and random mandala colors are done once per batch.
+    stage_times holds the busy time of every stage, summed over its threads. An optional
+    StageProfiler records every span, plus the "check" (completion lookup) and "batch" spans.
+    """
+    stage_names = ("render", "encode", "write")
+
+    def __init__(self, settings, writers, device, should_stop, counters, render_threads=1, encode_threads=1, write_threads=PIPELINE_WRITE_THREADS, profiler=None):
+        self.settings = settings
+        self.targets = settings["targets"]
+        self.writers = writers
+        self.device = device
+        self.should_stop = should_stop
+        self.counters = counters
+        self.profiler = profiler
+        self.color_source = settings["color_source"]
+        self.stage_threads = {"render": render_threads, "encode": encode_threads, "write": write_threads}
+        self.stage_functions = {"render": self.render_chunk, "encode": self.encode_chunk, "write": self.write_chunk}
+        self.queues = {name: queue.Queue(PIPELINE_QUEUE_SIZE) for name in self.stage_names}
+        self.max_depths = dict.fromkeys(self.stage_names, 0)
+        self.stage_times = dict.fromkeys(("colors",) + self.stage_names, 0.0)
+        self.stage_time_lock = threading.Lock()
+        self.error = None
+        self.interrupted = False
+        self.planner = BatchSizePlanner(
+            self.targets, settings["available_ram"], settings["available_gpu_memory"], settings["processes"], render_threads,
+            is_gpu_device(device)
+        )
+        self.max_additional_colors = max((target["colors_per_image"] - 1 for target in self.targets if target["pattern_type"] == "mandala"), default=None)
+
+        # Shard writers buffer whole shards, keep them within the memory budget
+        for writer in writers:
+            if isinstance(writer, ShardWriter) and writer.shard_size > self.planner.max_buffered_images():
+                writer.shard_size = self.planner.max_buffered_images()
+                logging.info(f"Shard size reduced to {writer.shard_size} images to fit the memory budget.")
+
+    def stopped(self):
+        return self.error is not None or self.interrupted or self.should_stop()
+
+    def queue_depths(self):
+        return {name: self.queues[name].qsize() for name in self.stage_names}
+
+    def record_stage(self, stage_name, start, end, images=0):
+        with self.stage_time_lock:
+            self.stage_times[stage_name] += end - start
+        if self.profiler is not None:
+            self.profiler.record(stage_name, start, end, images)
+
+    def put(self, stage_name, item):
+        self.queues[stage_name].put(item)
+        self.max_depths[stage_name] = max(self.max_depths[stage_name], self.queues[stage_name].qsize())
+
+    def iterate_batches(self, color_ranges):
+        """
+        Yields (start, end) position batches (end inclusive) of the (start, end) position ranges
+        (end exclusive), sized by the current plan.
+        """
+        for range_start, range_end in color_ranges:
+            batch_start = range_start
+            while batch_start < range_end:
+                batch_end = min(batch_start + self.planner.batch_size, range_end) - 1
+                yield batch_start, batch_end
+                batch_start = batch_end + 1
+
+    def run(self, color_ranges):
+        """
+        Generates the images of the (start, end) position ranges (end exclusive). Raises the first
+        error of any stage, or KeyboardInterrupt if the producer was interrupted.
+        """
+        if self.profiler is None:
+            run_stage = self.run_stage
+        else:
+            run_stage = functools.partial(self.profiler.run, self.run_stage)
+        threads = {name: [threading.Thread(target=run_stage, args=(name,), name=f"{name}-{i}", daemon=True) for i in range(max(1, self.stage_threads[name]))] for name in self.stage_names}
+        for stage_threads in threads.values():
+            for thread in stage_threads:
+                thread.start()
+
+        try:
+            last_stats = time.time()
+            for start_idx, end_idx in self.iterate_batches(color_ranges):
+                if self.stopped():
+                    break
+
+                batch_start = time.perf_counter()
+                pending = self.collect_pending(start_idx, end_idx)
+                while True:
+                    stage_start = time.perf_counter()
+                    chunk = next(pending, None)
+                    self.record_stage("colors", stage_start, time.perf_counter(), 0 if chunk is None else len(chunk[0]))
+                    if chunk is None:
+                        break
+
+                    self.put("render", chunk)
+                    self.planner.sample()
+                self.planner.adapt()
+                if self.profiler is not None:
+                    self.profiler.record("batch", batch_start, time.perf_counter(), end_idx - start_idx + 1)
+
+                if time.time() - last_stats >= PIPELINE_STATS_INTERVAL:
+                    last_stats = time.time()
+                    logging.info(f"Pipeline queue depths: {self.queue_depths()}")
+        except KeyboardInterrupt:
+            self.interrupted = True
+        finally:
+            # Shut the stages down in order, each one drains its queue before it exits
+            for name in self.stage_names:
+                for _ in threads[name]:
+                    self.queues[name].put(None)
+                for thread in threads[name]:
+                    thread.join()
+
+            # Free GPU memory after processing the batches
+            if is_gpu_device(self.device):
+                import_torch().cuda.empty_cache()
+
+        logging.info(f"Pipeline finished, maximum queue depths: {self.max_depths}")
+        if self.error is not None:
+            raise self.error
+        if self.interrupted:
+            raise KeyboardInterrupt
+
+    def run_stage(self, stage_name):
+        function = self.stage_functions[stage_name]
+        next_stage = {"render": "encode", "encode": "write"}.get(stage_name)
+        while True:
+            chunk = self.queues[stage_name].get()
+            if chunk is None:
+                break
+            if self.stopped():
+                continue  # Keep draining so the stage before never blocks
+
+            try:
+                stage_start = time.perf_counter()
+                results = function(chunk)
+                self.record_stage(stage_name, stage_start, time.perf_counter(), self.chunk_images(chunk))
+                for result in results:
+                    self.put(next_stage, result)
+            except Exception as e:
+                logging.error(f"Error in pipeline stage {stage_name}: {e}", exc_info=True)
+                if self.error is None:
+                    self.error = e
+
+    @staticmethod
+    def chunk_images(chunk):
+        # Images in a chunk of any stage: (entries, ...) for render, (target, entries, ...) for encode and write
+        return len(chunk[0]) if isinstance(chunk[0], list) else len(chunk[1])
+
+    def collect_pending(self, start_idx, end_idx):
+        """
+        Yields the colors at the positions start_idx..end_idx (inclusive) that still have to be
+        generated for any target, in chunks of (entries, base_colors, missing): a list of
+        (color_index, hex_color, base_color) tuples, their (N, 3) array of base colors and a
+        (targets, N) bool array telling which targets still miss each color.
+        """
+        # The colors are enumerated on the host, only the rendering runs on the device
+        color_indices = self.color_source.color_indices(start_idx, end_idx + 1)
+        check_start = time.perf_counter()
+        missing = np.stack([~writer.manifest.completed_at(color_indices) for writer in self.writers])
+        if self.profiler is not None:
+            self.profiler.record("check", check_start, time.perf_counter(), missing.size)
+        # Skip the images that already exist (e.g. written by another run on the same folder)
+        num_skipped = missing.size - int(np.count_nonzero(missing))
+        if num_skipped:
+            self.counters.add(0, num_skipped)  # Count even when skipping an image
+
+        pending = np.flatnonzero(missing.any(axis=0))
+        color_indices = color_indices[pending]
+        base_colors = np.stack((color_indices % 256, color_indices // 256 % 256, color_indices // 65536), axis=1)
+        missing = missing[:, pending]
+        if self.max_additional_colors is not None:
+            chunk_size = self.planner.render_chunk_size
+        else:
+            chunk_size = self.planner.chunk_size
+
+        for start in range(0, len(pending), chunk_size):
+            if self.stopped():
+                return
+
+            chunk_colors = base_colors[start:start + chunk_size]
+            entries = [(color_index, f"{r:02X}{g:02X}{b:02X}", (r, g, b)) for color_index, (r, g, b) in zip(color_indices[start:start + chunk_size].tolist(), chunk_colors.tolist())]
+            yield entries, chunk_colors, missing[:, start:start + chunk_size]
+
+    # The stage functions return the chunks for the next stage
+    def render_chunk(self, chunk):
+        entries, base_colors, missing = chunk
+        # The random mandala colors only depend on the seed and the color, they are drawn once for all targets
+        additional_colors = None
+        if self.max_additional_colors:
+            color_indices = [color_index for color_index, _, _ in entries]
+            additional_colors = draw_mandala_colors(color_indices, self.max_additional_colors, self.settings["seed"])
+
+        rendered = []
+        chunk_size = self.planner.chunk_size
+        for target_idx, target in enumerate(self.targets):
+            selected = np.flatnonzero(missing[target_idx])
+            if not len(selected):
+                continue
+            target_entries = entries if len(selected) == len(entries) else [entries[i] for i in selected]
+            image_width, image_height = target["image_width"], target["image_height"]
+            # Single color images are only rendered for raw pixel output, otherwise the encoder builds them from the color
+            if target["pattern_type"] == "mandala":
+                target_colors = None if additional_colors is None else additional_colors[selected]
+                pixels = render_mandala_batch(image_width, image_height, base_colors[selected], target["colors_per_image"] - 1, self.device, self.settings["seed"], target_colors)
+            elif self.writers[target_idx].stores_pixels:
+                pixels = render_solid_color_batch(image_width, image_height, base_colors[selected], self.device)
+            else:
+                pixels = None
+
+            # Hand the rendered images on in small chunks, so encoding and writing start early
+            rendered.extend((target_idx, target_entries[start:start + chunk_size], None if pixels is None else pixels[start:start + chunk_size])
+                            for start in range(0, len(target_entries), chunk_size))
+        return rendered
+
+    def encode_chunk(self, rendered):
+        target_idx, entries, pixels = rendered
+        writer = self.writers[target_idx]
+        if pixels is None:
+            image_width, image_height = self.targets[target_idx]["image_width"], self.targets[target_idx]["image_height"]
+            return [(target_idx, [(color_index, hex_color, writer.encode_solid_color(base_color, image_width, image_height)) for color_index, hex_color, base_color in entries])]
+        return [(target_idx, [(color_index, hex_color, writer.encode(image_pixels)) for (color_index, hex_color, _), image_pixels in zip(entries, pixels)])]
+
+    def write_chunk(self, encoded):
+        target_idx, images = encoded
+        writer = self.writers[target_idx]
+        for color_index, hex_color, data in images:
+            if self.stopped():
+                break
+
+            writer.write_encoded(color_index, hex_color, data)
+            self.counters.add(1, 0)
+        return []
+
+def split_color_ranges(color_ranges, parts):
+    """
+    Splits a list of (start, end) color ranges (end exclusive) into at most `parts` lists of
+    consecutive ranges holding a balanced number of colors each.
+    """
+    total_colors = sum(end - start for start, end in color_ranges)
+    parts = max(1, min(parts, total_colors))
+    split_ranges = [[] for _ in range(parts)]
+    position = 0
+    for start, end in color_ranges:
+        while start < end:
+            # The part that owns the current position and the position where it ends
+            part = position * parts // total_colors
+            part_end = -(-(part + 1) * total_colors // parts)
+            length = min(end - start, part_end - position)
+            split_ranges[part].append((start, start + length))
+            start += length
+            position += length
+    return [ranges for ranges in split_ranges if ranges]
+
+def create_stage_profiler(worker_idx, settings):
+    """
+    Returns a StageProfiler for the pipeline of a worker if settings["profile_dir"] is set, else None.
+    """
+    if settings["profile_dir"] is None:
+        return None
+    return StageProfiler(worker_idx, settings["python_profiler"])
+
+def run_profiled_pipeline(pipeline, color_ranges, settings):
+    """
+    Runs the pipeline, under the python profiler of its StageProfiler if it has one.
+    Returns the exported profile or None.
+    """
+    profiler = pipeline.profiler
+    if profiler is None:
+        pipeline.run(color_ranges)
+        return None
+    try:
+        profiler.run(pipeline.run, color_ranges)
+    finally:
+        profiler.dump_python_profile(settings["profile_dir"])
+    return profiler.export()
+
+def create_target_writers(settings):
+    """
+    Opens the completion manifest and creates the writer of every target of the settings.
+    """
+    layout = FolderLayout.parse(settings["layout"])
+    return [create_image_writer(settings["output_format"], target["color_folder"], CompletionManifest(target["manifest_path"], target["shared_manifest_paths"]), settings["shard_size"], settings["png_compress_level"], layout)
+            for target in settings["targets"]]
+
+def run_thread_backend(color_ranges, settings, workers, counters):
+    """
+    Runs one pipeline over the color ranges in this process, with `workers` threads in the
+    render and encode stages, sharing one writer per target. Returns the stage times of the pipeline
+    and the list of exported stage profiles (empty unless profiling).
+    """
+    global stop_generation
+    device = get_device(settings["device"])
+    writers = create_target_writers(settings)
+    pipeline = GenerationPipeline(settings, writers, device, lambda: stop_generation, counters, workers, workers, profiler=create_stage_profiler(0, settings))
+
+    profile = None
+    try:
+        profile = run_profiled_pipeline(pipeline, color_ranges, settings)
+    except KeyboardInterrupt:
+        # Ctrl+C stops the pipeline cleanly
+        stop_generation = True
+        logging.info("Interrupted, the generation has been stopped.")
+    finally:
+        # Write the images that are still buffered in incomplete shards
+        for writer in writers:
+            writer.close()
+        gc.collect()
+
+    return pipeline.stage_times, [profile] if profile is not None else []
+
+# State of a generation worker process, set by init_generation_worker
+worker_stop_event = None
+worker_progress = None
+
+def init_generation_worker(stop_event, progress, log_level):
+    global worker_stop_event, worker_progress
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # Ctrl+C is handled by the parent process
+    logging.getLogger().setLevel(log_level)
+    worker_stop_event = stop_event
+    worker_progress = progress
+
+def generate_color_ranges(worker_idx, color_ranges, settings):
+    """
+    Worker process: runs a pipeline over its consecutive (start, end) color ranges with its own writers.
+    The totals are published every PROGRESS_INTERVAL in worker_progress[2 * worker_idx] (generated)
+    and worker_progress[2 * worker_idx + 1] (skipped), which only this worker writes.
+    Returns the final counters, the stage times of the pipeline and its exported profile (None unless profiling).
+    """
+    device = get_device(settings["device"])
+    writers = create_target_writers(settings)
+    counters = ProgressCounters()
+    finished = threading.Event()
+
+    def publish_progress():
+        worker_progress[2 * worker_idx], worker_progress[2 * worker_idx + 1] = counters.totals()
+
+    def run_publisher():
+        while not finished.wait(PROGRESS_INTERVAL):
+            publish_progress()
+
+    publisher = threading.Thread(target=run_publisher, daemon=True)
+    publisher.start()
+    pipeline = GenerationPipeline(settings, writers, device, worker_stop_event.is_set, counters, profiler=create_stage_profiler(worker_idx, settings))
+    try:
+        profile = run_profiled_pipeline(pipeline, color_ranges, settings)
+        logging.info(f"Worker {worker_idx}: positions {color_ranges[0][0]}-{color_ranges[-1][1] - 1} processed successfully.")
+    finally:
+        # Write the images that are still buffered in incomplete shards
+        for writer in writers:
+            writer.close()
+        finished.set()
+        publisher.join()
+        publish_progress()
+
+    generated, skipped = counters.totals()
+    return generated, skipped, pipeline.stage_times, profile
+
+def run_process_backend(worker_ranges, settings, counters):
+    """
+    Runs one worker process per entry of worker_ranges (lists of contiguous color ranges).
+    The workers write their images directly and publish their totals in the shared counters,
+    the parent only forwards the stop flag. Returns the stage times summed over all workers and the
+    list of exported stage profiles of the workers (empty unless profiling).
+    """
+    global stop_generation
+    stage_times = {}
+    profiles = []
+    if not worker_ranges:
+        return stage_times, profiles
+    # Spawned workers do not inherit an initialized CUDA context from the parent
+    context = multiprocessing.get_context("spawn")
+    stop_event = context.Event()
+
+    with ProcessPoolExecutor(max_workers=len(worker_ranges), mp_context=context, initializer=init_generation_worker, initargs=(stop_event, counters.values, logging.getLogger().level)) as executor:
+        pending = {executor.submit(generate_color_ranges, worker_idx, ranges, settings)
+                   for worker_idx, ranges in enumerate(worker_ranges)}
+
+        while pending:
+            try:
+                done, pending = wait(pending, timeout=PROGRESS_INTERVAL)
+            except KeyboardInterrupt:
+                stop_generation = True
+                logging.info("Interrupted, waiting for the worker processes to stop.")
+                continue
+
+            if stop_generation:
+                stop_event.set()
+
+            for future in done:
+                try:
+                    _, _, worker_stage_times, profile = future.result()
+                except Exception:
+                    stop_event.set()
+                    raise
+                for stage_name, seconds in worker_stage_times.items():
+                    stage_times[stage_name] = stage_times.get(stage_name, 0.0) + seconds
+                if profile is not None:
+                    profiles.append(profile)
+
+    return stage_times, sorted(profiles, key=lambda profile: profile["worker"])
+
+def run_generation(output_dir, num_colors_start, num_colors_end, image_width, image_height, colors_per_image=5, pattern_type="single", output_format="png", shard_size=DEFAULT_SHARD_SIZE, progress_callback=None, backend="process", workers=None, verify=False, png_compress_level=DEFAULT_PNG_COMPRESS_LEVEL, device=None, color_source=None, seed=DEFAULT_MANDALA_SEED, layout="flat", profile_dir=None, python_profiler=None):
+    """
+    Generates the images without any GUI and returns a summary dict.
+    progress_callback is called as progress_callback(images_generated, total_images, estimated_time,
+    images_per_second, skipped_images, elapsed_time). Errors are raised to the caller.
+    backend selects a pool of worker processes ("process") or threads ("thread");
+    workers defaults to the number of CPU cores. Finished colors are looked up in the completion
+    manifest of the output folder; verify rebuilds it from the files on disk first.
+    png_compress_level (0-9) trades PNG file size against encoding speed.
+    device "cpu" (default) renders with NumPy, "cuda" or "auto" with torch on the GPU if available.
+    color_source (a ColorSource, see create_color_source) replaces the color range
+    num_colors_start..num_colors_end (end exclusive).
+    seed keys the random mandala colors; an image only depends on the seed and its color.
+    layout ("flat", "prefix[:depth]" or "hashed[:depth]") places the png images in subdirectories.
+    profile_dir enables the stage profiler and receives its reports (see write_profile);
+    python_profiler ("cprofile" or "sampling") also profiles the Python code of the workers.
+    """
+    if color_source is None:
+        color_source = RangeColorSource(num_colors_start, num_colors_end)
+    target = {"pattern_type": pattern_type, "image_width": image_width, "image_height": image_height, "colors_per_image": colors_per_image}
+    return run_generation_job(output_dir, [target], color_source, output_format, shard_size, progress_callback, backend, workers, verify, png_compress_level, device, seed, layout, profile_dir, python_profiler)
+
+def parse_target(target):
+    """
+    Parses a target like "single:8x8" or "mandala:32x32:5" (pattern, size, colors per image) into a target dict.
+    """
+    parts = target.split(":")
+    if len(parts) not in (2, 3):
+        raise ValueError(f"Invalid target, expected pattern:WxH[:colors_per_image]: {target}")
+    image_width, image_height = parse_image_size(parts[1])
+    colors_per_image = int(parts[2]) if len(parts) == 3 else 5
+    return {"pattern_type": parts[0], "image_width": image_width, "image_height": image_height, "colors_per_image": colors_per_image}
+
+def load_job_targets(job_path):
+    """
+    Reads the targets of a job spec, a JSON file like {"targets": ["single:1x1", {"pattern_type": "mandala",
+    "image_width": 32, "image_height": 32, "colors_per_image": 5}]}.
+    """
+    with open(job_path) as job_file:
+        job = json.load(job_file)
+    targets = []
+    for target in job["targets"]:
+        if isinstance(target, str):
+            targets.append(parse_target(target))
+        else:
+            targets.append({"pattern_type": target.get("pattern_type", "single"), "image_width": target.get("image_width", 1),
+                            "image_height": target.get("image_height", 1), "colors_per_image": target.get("colors_per_image", 5)})
+    return targets
+
+def run_generation_job(output_dir, targets, color_source, output_format="png", shard_size=DEFAULT_SHARD_SIZE, progress_callback=None, backend="process", workers=None, verify=False, png_compress_level=DEFAULT_PNG_COMPRESS_LEVEL, device=None, seed=DEFAULT_MANDALA_SEED, layout="flat", profile_dir=None, python_profiler=None, manifest_owner=None):
+    """
+    Generates the images of several targets (dicts with pattern_type, image_width, image_height and
+    colors_per_image) in one sweep over the colors of color_source, each target into its own folder.
+    Colors are enumerated, checked and given their random mandala colors once for all targets.
+    The other arguments are those of run_generation; total_images counts every target.
+    manifest_owner marks the finished colors in the own completion manifest of that machine
+    (see CompletionManifest), as every machine of a distributed run does.
+    When profiling, summary["profile"] holds the paths of the written reports.
+    """
+    global stop_generation
+    if not targets:
+        raise ValueError("No targets to generate")
+    # A stop of an earlier run (Ctrl+C or the GUI Stop button) must not end this one
+    stop_generation = False
+    for target in targets:
+        if target["pattern_type"] not in ("single", "mandala"):
+            raise ValueError(f"Unknown pattern type: {target['pattern_type']}")
+        if target["image_width"] < 1 or target["image_height"] < 1:
+            raise ValueError(f"Image size must be at least 1x1: {target['image_width']}x{target['image_height']}")
+    if len({(target["pattern_type"], target["image_width"], target["image_height"]) for target in targets}) < len(targets):
+        raise ValueError("Targets with the same pattern and size would share a folder")
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"Unknown output format: {output_format}")
+    if backend not in GENERATION_BACKENDS:
+        raise ValueError(f"Unknown backend: {backend}")
+    if not 0 <= png_compress_level <= 9:
+        raise ValueError(f"PNG compression level must be between 0 and 9: {png_compress_level}")
+    if python_profiler not in (None,) + PYTHON_PROFILERS:
+        raise ValueError(f"Unknown python profiler: {python_profiler}")
+    if python_profiler is not None and profile_dir is None:
+        raise ValueError("The python profiler needs a profile directory")
+    workers = max(1, workers or os.cpu_count() or 1)
+    folder_layout = FolderLayout.parse(layout)
+    if folder_layout.kind != "flat" and output_format != "png":
+        raise ValueError(f"The {folder_layout} layout only applies to png output")
+
+    target_names = ", ".join(f"{target['pattern_type']} {target['image_width']}x{target['image_height']}" + (f" ({target['colors_per_image']} colors)" if target["pattern_type"] == "mandala" else "") for target in targets)
+    logging.info(f"Starting image generation. Output directory: {output_dir}, Colors: {color_source!r}, Targets: {target_names}, Output format: {output_format}, Backend: {backend} ({workers} workers).")
+    
+    # Check if 'RGB_Colors' is already in the output_dir
+    if not output_dir.endswith("RGB_Colors"):
+        output_dir = os.path.join(output_dir, "RGB_Colors")
+    
+    # Create the main 'RGB_Colors' folder if it doesn't exist
+    os.makedirs(output_dir, exist_ok=True)
+    logging.info(f"Created output directory: {output_dir}.")
+
+    manifests = []
+    target_settings = []
+    for target in targets:
+        # Create the subfolder for the pattern type (e.g., Single or Mandala)
+        pattern_folder = os.path.join(output_dir, target["pattern_type"].capitalize())
+        os.makedirs(pattern_folder, exist_ok=True)
+        logging.info(f"Created pattern folder: {pattern_folder}.")
+
+        # Create the subfolder named after the image size (e.g., 1x1 or 2x3) inside the pattern folder
+        size_folder = f"{target['image_width']}x{target['image_height']}"
+        color_folder = os.path.join(pattern_folder, size_folder)
+        os.makedirs(color_folder, exist_ok=True)  # Ensure the subfolder for the size is created
+        logging.info(f"Created size folder: {color_folder}.")
+
+        if output_format == "png":
+            FolderLayout.open(color_folder, folder_layout)
+        manifest = CompletionManifest.open(color_folder, output_format, verify, manifest_owner)
+        manifests.append(manifest)
+        target_settings.append(dict(target, color_folder=color_folder, manifest_path=manifest.manifest_path, shared_manifest_paths=manifest.shared_paths))
+
+    total_images = len(color_source) * len(targets)
+    start_time = time.time()
+
+    # Only the colors that are missing in a completion manifest are distributed to the workers
+    already_completed, color_ranges = color_source.missing_ranges(manifests)
+    del manifests
+    logging.info(f"{already_completed} images already exist, {len(color_ranges)} missing position ranges.")
+
+    # Get available memory, the pipelines plan their batch sizes from it
+    available_ram, available_gpu_memory = get_available_memory(device in ("cuda", "auto"))
+    settings = {
+        "targets": target_settings,
+        "output_format": output_format,
+        "shard_size": shard_size,
+        "png_compress_level": png_compress_level,
+        "device": device,
+        "color_source": color_source,
+        "seed": seed,
+        "layout": str(folder_layout),
+        "available_ram": available_ram,
+        "available_gpu_memory": available_gpu_memory,
+        "profile_dir": None if profile_dir is None else os.path.abspath(profile_dir),
+        "python_profiler": python_profiler,
+    }
+    if profile_dir is not None:
+        os.makedirs(profile_dir, exist_ok=True)
+
+    # The workers only count, the progress is reported from a separate thread at PROGRESS_INTERVAL
+    if backend == "process":
+        worker_ranges = split_color_ranges(color_ranges, workers)
+        settings["processes"] = max(1, len(worker_ranges))
+        counters = SharedProgressCounters(multiprocessing.get_context("spawn"), len(worker_ranges))
+    else:
+        settings["processes"] = 1
+        counters = ProgressCounters()
+
+    reporter = ProgressReporter(counters.totals, total_images, progress_callback, already_completed)
+    reporter.start()
+    try:
+        if backend == "process":
+            stage_times, profiles = run_process_backend(worker_ranges, settings, counters)
+        else:
+            stage_times, profiles = run_thread_backend(color_ranges, settings, workers, counters)
+    finally:
+        reporter.stop()
+
+    images_generated, skipped_images = counters.totals()
+    skipped_images += already_completed
+
+    status = "stopped" if stop_generation else "completed"
+    logging.info(f"Image generation {status}. Generated: {images_generated}, Skipped: {skipped_images}.")
+    summary = {
+        "status": status,
+        "output_folder": target_settings[0]["color_folder"],
+        "output_folders": [target["color_folder"] for target in target_settings],
+        "total_images": total_images,
+        "images_generated": images_generated,
+        "skipped_images": skipped_images,
+        "elapsed_time": time.time() - start_time,
+        "stage_times": stage_times,
+    }
+    if profile_dir is not None:
+        summary["profile"] = write_profile(profile_dir, profiles)
+    return summary
+
+def generate_images(output_dir, num_colors_start, num_colors_end, image_width, image_height, colors_per_image, pattern_type, progress_label, progress_bar, info_label, elapsed_label, update_progress_callback, output_format="png", shard_size=DEFAULT_SHARD_SIZE, backend="process", workers=None, verify=False, png_compress_level=DEFAULT_PNG_COMPRESS_LEVEL):
+    """
+    GUI entry point: runs run_generation and reports the result in message boxes.
+    """
+    try:
+        result = run_generation(output_dir, num_colors_start, num_colors_end, image_width, image_height, colors_per_image, pattern_type, output_format, shard_size, update_progress_callback, backend, workers, verify, png_compress_level)
+
+        # Show completion message
+        if result["status"] == "completed":
+            messagebox.showinfo("Finished", "The images have been successfully generated!")
+            logging.info("Image generation completed successfully.")
+        else:
+            messagebox.showinfo("Aborted", "The image generation has been stopped.")
+            logging.info("Image generation was stopped by the user.")
+
+    except Exception as e:
+        # Handle errors
+        logging.error(f"Error during image generation: {e}", exc_info=True)
+        messagebox.showerror("Error", f"An error occurred: {e}")
+
+# Distributed generation: work units of a color source, claimed through lease files in a shared directory
+DEFAULT_UNIT_SIZE = 1 << 18  # Positions of the color source per work unit
+DEFAULT_LEASE_TIMEOUT = 300.0  # Seconds without heartbeat after which a lease may be stolen
+JOB_SETTINGS = ("color_source", "targets", "output_format", "shard_size", "seed", "layout", "unit_size")
+
+def parse_shard(shard):
+    """
+    Parses a shard like "2/8" into (shard_index, num_shards), shard indices start at 0.
+    """
+    match = re.fullmatch(r"(\d+)/(\d+)", shard.strip())
+    if not match or not 0 <= int(match.group(1)) < int(match.group(2)):
+        raise argparse.ArgumentTypeError(f"Invalid shard, expected k/N with 0 <= k < N: {shard}")
+    return int(match.group(1)), int(match.group(2))
+
+def shard_range(length, shard_index, num_shards):
+    """
+    Returns the balanced (start, end) range (end exclusive) of shard shard_index of num_shards.
+    """
+    return length * shard_index // num_shards, length * (shard_index + 1) // num_shards
+
+def get_color_folder(output_dir, pattern_type, image_width, image_height):
+    if not output_dir.endswith("RGB_Colors"):
+        output_dir = os.path.join(output_dir, "RGB_Colors")
+    return os.path.join(output_dir, pattern_type.capitalize(), f"{image_width}x{image_height}")
+
+class ClaimDirectory:
+    """
+    Coordinates the machines of a distributed run through files in a shared directory.
+    job.json holds the settings every machine has to agree on. unit_XXXXXXXX.lease is created
+    exclusively by the machine working on a unit and touched as heartbeat; unit_XXXXXXXX.done
+    is renamed into place when the unit is finished. A lease without heartbeat for lease_timeout
+    seconds is stolen by renaming it away first, which only one machine can do.
+    """
+    def __init__(self, claim_dir, owner=None, lease_timeout=DEFAULT_LEASE_TIMEOUT):
+        self.claim_dir = claim_dir
+        # Stable per host, so the machine manifest of a host is reused by its later runs
+        self.owner = owner or socket.gethostname()
+        self.lease_timeout = lease_timeout
+        os.makedirs(claim_dir, exist_ok=True)
+
+    def get_path(self, name):
+        return os.path.join(self.claim_dir, name)
+
+    def unit_path(self, unit, suffix):
+        return self.get_path(f"unit_{unit:08d}.{suffix}")
+
+    def write_file(self, path, data, exclusive=False):
+        """
+        Writes a JSON file atomically. With exclusive, an existing file is kept and False is returned.
+        """
+        temp_fd, temp_path = tempfile.mkstemp(prefix=".tmp_", dir=self.claim_dir)
+        with os.fdopen(temp_fd, "w") as temp_file:
+            json.dump(data, temp_file, indent=2)
+        os.chmod(temp_path, SHARED_FILE_MODE)
+        try:
+            if not exclusive:
+                os.replace(temp_path, path)
+                return True
+            try:
+                os.link(temp_path, path)
+                return True
+            except FileExistsError:
+                return False
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def load_job(self):
+        with open(self.get_path("job.json")) as job_file:
+            return json.load(job_file)
+
+    def init_job(self, job):
+        """
+        Registers the job settings, or checks them against the settings of the machine that started the job.
+        """
+        if not self.write_file(self.get_path("job.json"), job, exclusive=True):
+            existing_job = self.load_job()
+            for name in JOB_SETTINGS:
+                if existing_job.get(name) != job.get(name):
+                    raise ValueError(f"Job setting {name} differs from the job in {self.claim_dir}: {job.get(name)} != {existing_job.get(name)}")
+        return self.load_job()
+
+    def is_done(self, unit):
+        return os.path.exists(self.unit_path(unit, "done"))
+
+    def try_claim(self, unit):
+        if self.is_done(unit):
+            return False
+        lease_path = self.unit_path(unit, "lease")
+        if os.path.exists(lease_path) and not self.steal_stale_lease(lease_path):
+            return False
+        try:
+            lease_fd = os.open(lease_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            return False  # Claimed by another machine in the meantime
+        with os.fdopen(lease_fd, "w") as lease_file:
+            json.dump({"owner": self.owner, "claimed": time.time()}, lease_file)
+        # The unit may have been finished between the check and the claim
+        if self.is_done(unit):
+            self.release(unit)
+            return False
+        return True
+
+    def is_stale(self, lease_path):
+        return time.time() - os.stat(lease_path).st_mtime >= self.lease_timeout
+
+    def live_owners(self):
+        """
+        Returns the owners of the leases that are still kept alive by their heartbeat.
+        """
+        owners = set()
+        for entry in os.scandir(self.claim_dir):
+            if not entry.name.endswith(".lease"):
+                continue
+            try:
+                if not self.is_stale(entry.path):
+                    with open(entry.path) as lease_file:
+                        owners.add(json.load(lease_file)["owner"])
+            except (FileNotFoundError, ValueError):
+                pass  # Released meanwhile, or claimed and not written yet
+        return owners
+
+    def steal_stale_lease(self, lease_path):
+        """
+        Removes a lease without heartbeat for lease_timeout seconds, returns whether the unit may be
+        claimed. Another machine may steal the same lease and claim the unit between the staleness
+        check and the rename, so the renamed lease is checked again and put back if it is fresh.
+        """
+        try:
+            if not self.is_stale(lease_path):
+                return False
+            stale_path = f"{lease_path}.stale.{self.owner}.{os.getpid()}"
+            os.rename(lease_path, stale_path)
+        except FileNotFoundError:
+            return True  # Released or stolen by someone else, it may be claimed again
+        if not self.is_stale(stale_path):
+            try:
+                # A link never replaces a lease that was created in the meantime
+                os.link(stale_path, lease_path)
+            except FileExistsError:
+                logging.warning(f"Could not restore the fresh lease {os.path.basename(lease_path)}, it was claimed again.")
+            os.remove(stale_path)
+            return False
+        os.remove(stale_path)
+        logging.info(f"Stole stale lease {os.path.basename(lease_path)}.")
+        return True
+
+    def heartbeat(self, unit):
+        try:
+            os.utime(self.unit_path(unit, "lease"))
+        except FileNotFoundError:
+            logging.warning(f"Lease of unit {unit} was stolen.")
+
+    def complete(self, unit, summary):
+        self.write_file(self.unit_path(unit, "done"), dict(summary, owner=self.owner, finished=time.time()))
+        self.release(unit)
+
+    def release(self, unit):
+        try:
+            os.remove(self.unit_path(unit, "lease"))
+        except FileNotFoundError:
+            pass
+
+    def claim_next(self, num_units, preferred_units=()):
+        """
+        Claims the next unit: the preferred units (the own shard) first, then the units of the other
+        shards from the back, so idle machines steal the work their owners would reach last.
+        Returns None when every unit is finished or leased.
+        """
+        preferred_units = list(preferred_units)
+        preferred = set(preferred_units)
+        other_units = [unit for unit in reversed(range(num_units)) if unit not in preferred]
+        for unit in preferred_units + other_units:
+            if self.try_claim(unit):
+                return unit
+        return None
+
+def run_distributed_generation(output_dir, claim_dir, job, shard_index=0, num_shards=1, owner=None, lease_timeout=DEFAULT_LEASE_TIMEOUT, progress_callback=None, backend="process", workers=None, verify=False, png_compress_level=DEFAULT_PNG_COMPRESS_LEVEL, device=None, profile_dir=None, python_profiler=None):
+    """
+    Generates the work units of a job claimed in the shared claim_dir until none is left: first the
+    units of shard shard_index of num_shards, then unfinished units of the other shards.
+    job holds the JOB_SETTINGS, its color_source being the keyword arguments of create_color_source.
+    Returns a summary dict like run_generation, with the finished units.
+    When profiling, the reports of every unit are written to profile_dir/unit_<unit>.
+    verify rebuilds the shared completion manifests once before the first unit and discards the
+    manifests of the machines that hold no live lease.
+    """
+    global stop_generation
+    stop_generation = False
+    claims = ClaimDirectory(claim_dir, owner, lease_timeout)
+    job = claims.init_job(dict(job, output_dir=output_dir))
+    color_source = create_color_source(**job["color_source"])
+    unit_size = job["unit_size"]
+    num_units = -(-len(color_source) // unit_size)
+    own_units = range(*shard_range(num_units, shard_index, num_shards))
+    logging.info(f"Distributed run as {claims.owner}: {num_units} units of {unit_size} colors, shard {shard_index}/{num_shards} owns units {own_units.start}-{own_units.stop - 1}.")
+
+    # The units only read the shared manifests, so verify rebuilds them once instead of scanning the folders per unit
+    if verify:
+        live_owners = claims.live_owners()
+        for target in job["targets"]:
+            color_folder = get_color_folder(output_dir, target["pattern_type"], target["image_width"], target["image_height"])
+            os.makedirs(color_folder, exist_ok=True)
+            keep_paths = [CompletionManifest.get_owner_path(color_folder, job["output_format"], live_owner) for live_owner in live_owners]
+            CompletionManifest.verify(color_folder, job["output_format"], keep_paths)
+
+    start_time = time.time()
+    summary = {"status": "completed", "units": [], "images_generated": 0, "skipped_images": 0, "stage_times": {}}
+    while not stop_generation:
+        unit = claims.claim_next(num_units, own_units)
+        if unit is None:
+            break
+
+        # Keep the lease alive while the unit is generated
+        finished = threading.Event()
+
+        def run_heartbeat():
+            while not finished.wait(lease_timeout / 4):
+                claims.heartbeat(unit)
+
+        heartbeat = threading.Thread(target=run_heartbeat, daemon=True)
+        heartbeat.start()
+        try:
+            unit_source = SliceColorSource(color_source, unit * unit_size, (unit + 1) * unit_size)
+            result = run_generation_job(
+                output_dir, job["targets"], unit_source, job["output_format"], job["shard_size"], progress_callback,
+                backend, workers, False, png_compress_level, device, job["seed"], job["layout"],
+                None if profile_dir is None else os.path.join(profile_dir, f"unit_{unit}"), python_profiler, claims.owner
+            )
+        except BaseException:
+            claims.release(unit)
+            raise
+        finally:
+            finished.set()
+            heartbeat.join()
+
+        summary["images_generated"] += result["images_generated"]
+        summary["skipped_images"] += result["skipped_images"]
+        for stage_name, seconds in result["stage_times"].items():
+            summary["stage_times"][stage_name] = summary["stage_times"].get(stage_name, 0.0) + seconds
+        if result["status"] != "completed":
+            claims.release(unit)
+            summary["status"] = result["status"]
+            break
+        claims.complete(unit, {"images_generated": result["images_generated"], "skipped_images": result["skipped_images"]})
+        summary["units"].append(unit)
+        logging.info(f"Unit {unit} finished.")
+
+    if stop_generation:
+        summary["status"] = "stopped"
+    summary["elapsed_time"] = time.time() - start_time
+    logging.info(f"Distributed run {summary['status']}, {len(summary['units'])} units finished by {claims.owner}.")
+    return summary
+
+def validate_coverage(claim_dir, output_dir=None):
+    """
+    Merge step of a distributed run: rebuilds the completion manifests from the files on disk and
+    checks that every color of the job is present for every target and every unit is marked done.
+    output_dir defaults to the output directory of the machine that started the job.
+    Returns a report dict, "complete" tells whether nothing is missing.
+    """
+    claims = ClaimDirectory(claim_dir)
+    job = claims.load_job()
+    color_source = create_color_source(**job["color_source"])
+    num_units = -(-len(color_source) // job["unit_size"])
+    pending_units = [unit for unit in range(num_units) if not claims.is_done(unit)]
+    live_owners = claims.live_owners()
+
+    target_reports = []
+    for target in job["targets"]:
+        color_folder = get_color_folder(output_dir or job["output_dir"], target["pattern_type"], target["image_width"], target["image_height"])
+        if not os.path.isdir(color_folder):
+            raise FileNotFoundError(f"Output folder not found: {color_folder}")
+
+        # The rebuild folds the machine manifests into the shared one, only those of live machines are kept
+        CompletionManifest.verify(color_folder, job["output_format"], [CompletionManifest.get_owner_path(color_folder, job["output_format"], live_owner) for live_owner in live_owners])
+        manifest = CompletionManifest.open(color_folder, job["output_format"])
+        completed_images, missing_ranges = color_source.missing_ranges([manifest])
+        target_reports.append({
+            "output_folder": color_folder,
+            "completed_images": completed_images,
+            "missing_images": sum(end - start for start, end in missing_ranges),
+            "missing_ranges": missing_ranges,
+        })
+        logging.info(f"Coverage of {color_folder}: {completed_images}/{len(color_source)} images.")
+
+    missing_images = sum(target_report["missing_images"] for target_report in target_reports)
+    report = {
+        "complete": missing_images == 0 and not pending_units,
+        "total_images": len(color_source) * len(job["targets"]),
+        "completed_images": sum(target_report["completed_images"] for target_report in target_reports),
+        "missing_images": missing_images,
+        "targets": target_reports,
+        "units": num_units,
+        "pending_units": pending_units,
+    }
+    logging.info(f"{len(pending_units)} of {num_units} units pending.")
+    return report
+
+# Benchmark suite
+BENCHMARK_SIZES = ((1, 1), (8, 8), (64, 64), (512, 512))
+
+def parse_image_size(size):
+    """
+    Parses an image size like "64x64" into (width, height).
+    """
+    width, height = size.lower().split("x")
+    return int(width), int(height)
+
+class MemorySampler:
+    """
+    Samples the RSS of this process and all of its worker processes in a background thread
+    and keeps the peak. Used as a context manager around a benchmark run.
+    """
+    def __init__(self, interval=0.05):
+        self.interval = interval
+        self.peak_rss = 0
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def __enter__(self):
+        self.sample()
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop_event.set()
+        self.thread.join()
+        self.sample()
+
+    def run(self):
+        while not self.stop_event.wait(self.interval):
+            self.sample()
+
+    def sample(self):
+        import psutil
+        process = psutil.Process()
+        rss = process.memory_info().rss
+        for child in process.children(recursive=True):
+            try:
+                rss += child.memory_info().rss
+            except psutil.Error:
+                pass  # The worker exited between listing and sampling
+        self.peak_rss = max(self.peak_rss, rss)
+
+def get_output_size(folder):
+    """
+    Total size in bytes of the generated files below folder (hidden files like the manifest are ignored).
+    """
+    total = 0
+    for entry in os.scandir(folder):
+        if entry.name.startswith("."):
+            continue
+        if entry.is_dir(follow_symlinks=False):
+            total += get_output_size(entry.path)
+        else:
+            total += entry.stat(follow_symlinks=False).st_size
+    return total
+
+def run_benchmark(patterns=("single", "mandala"), sizes=BENCHMARK_SIZES, colors_per_image_values=(5,), workers_values=(None,), devices=("cpu",), num_images=1000, output_format="png", backend="process", png_compress_level=DEFAULT_PNG_COMPRESS_LEVEL):
+    """
+    Runs the generation for every combination of the given settings in a temporary directory
+    and returns a JSON-serializable report with throughput, stage times, peak memory and bytes written.
+    colors_per_image_values only applies to the mandala pattern.
+    """
+    global stop_generation
+    stop_generation = False
+    results = []
+    for pattern_type in patterns:
+        for image_width, image_height in sizes:
+            for colors_per_image in (colors_per_image_values if pattern_type == "mandala" else colors_per_image_values[:1]):
+                for workers in workers_values:
+                    for device in devices:
+                        if device == "cuda" and not is_cuda_available():
+                            logging.warning("Skipping CUDA benchmark, no GPU available.")
+                            continue
+
+                        with tempfile.TemporaryDirectory() as output_dir:
+                            with MemorySampler() as memory:
+                                summary = run_generation(output_dir, 0, num_images, image_width, image_height, colors_per_image, pattern_type, output_format,
+                                                         backend=backend, workers=workers, png_compress_level=png_compress_level, device=device)
+                            bytes_written = get_output_size(summary["output_folder"])
+
+                        elapsed_time = summary["elapsed_time"]
+                        result = {
+                            "pattern_type": pattern_type,
+                            "image_width": image_width,
+                            "image_height": image_height,
+                            "colors_per_image": colors_per_image,
+                            "workers": workers or os.cpu_count(),
+                            "device": device,
+                            "backend": backend,
+                            "output_format": output_format,
+                            "images": summary["images_generated"],
+                            "elapsed_time": round(elapsed_time, 4),
+                            "images_per_second": round(summary["images_generated"] / elapsed_time, 2) if elapsed_time > 0 else 0,
+                            "stage_times": {stage_name: round(seconds, 4) for stage_name, seconds in summary["stage_times"].items()},
+                            "peak_rss_mb": round(memory.peak_rss / 1024 ** 2, 1),
+                            "bytes_written": bytes_written,
+                        }
+                        logging.info(f"Benchmark {pattern_type} {image_width}x{image_height}, {result['workers']} workers, {device}: {result['images_per_second']} images per second.")
+                        results.append(result)
+
+    return {
+        "python": sys.version.split()[0],
+        "platform": sys.platform,
+        "cpu_count": os.cpu_count(),
+        "num_images": num_images,
+        "results": results,
+    }
+
+# Format time function
+def format_time(seconds):
+    try:
+        # Convert seconds to days, hours, minutes, and seconds
+        days, remainder = divmod(seconds, 86400)  # 1 day = 86400 seconds
+        hours, remainder = divmod(remainder, 3600)  # 1 hour = 3600 seconds
+        minutes, seconds = divmod(remainder, 60)  # 1 minute = 60 seconds
+
+        # Ensure seconds are shown as whole numbers (no decimals)
+        days = int(days)
+        hours = int(hours)
+        minutes = int(minutes)
+        seconds = int(seconds)
+        
+        if days > 0:
+            return f"{days} Days, {hours} h"
+        else:
+            return f"{hours} h {minutes} min {seconds} sec"
+    except Exception as e:
+        logging.error(f"Error in format_time: {e}")
+        raise
+
+# Folder selection dialog
+def select_output_folder():
+    try:
+        folder = filedialog.askdirectory()
+        if folder:
+            app.output_dir_var.set(os.path.join(folder, "RGB_Colors"))
+            logging.info(f"Output directory selected: {folder}/RGB_Colors")
+    except Exception as e:
+        logging.error(f"Error in select_output_folder: {e}")
+        messagebox.showerror("Error", f"An error occurred: {e}")
+
+# Start generation
+def start_generation():
+    global stop_generation
+    stop_generation = False
+    try:
+        logging.info("Starting image generation process.")
+        threading.Thread(target=generate_images, args=(
+            app.output_dir_var.get(),
+            app.num_colors_start_var.get(),
+            app.num_colors_end_var.get(),
+            app.image_width_var.get(),
+            app.image_height_var.get(),
+            app.colors_per_image_var.get(),
+            app.pattern_type_var.get(),
+            app.progress_label,
+            app.progress_bar,
+            app.info_label,
+            app.elapsed_label,
+            app.schedule_progress_update,
+            app.output_format_var.get()
+        ), daemon=True).start()
+    except RuntimeError as e:
+        logging.error(f"Error in start_generation: {e}")
+        messagebox.showerror("Error", f"An error occurred: {e}")
+
+# Stop generation process
+def stop_generation_process():
+    global stop_generation
+    try:
+        stop_generation = True
+        logging.info("Stopping image generation process.")
+    except Exception as e:
+        logging.error(f"Error in stop_generation_process: {e}")
+        messagebox.showerror("Error", f"An error occurred: {e}")
+
+# Update progress bar
+def update_progress_gui(images_generated, total_images, estimated_time, images_per_second, skipped_images, elapsed_time):
+    try:
+        app.progress_label.config(
+            text=f"Progress: {images_generated}/{total_images} "
+                 f"Remaining time: {format_time(estimated_time)}"
+        )
+        app.progress_bar['value'] = (images_generated / total_images) * 100
+        app.info_label.config(text=f"Skipped Images: {skipped_images}")
+        app.speed_label.config(text=f"Images per Second: {images_per_second:.2f}")
+        app.elapsed_label.config(text=f"Elapsed Time: {format_time(elapsed_time)}")
+        logging.debug(f"Progress: {images_generated}/{total_images}, Remaining time: {format_time(estimated_time)}, Images per second: {images_per_second:.2f}, Elapsed time: {format_time(elapsed_time)}, Skipped images: {skipped_images}")
+    except Exception as e:
+        logging.error(f"Error in update_progress_gui: {e}")
+        messagebox.showerror("Error", f"An error occurred: {e}")
+
+# Get device (CPU or GPU): "cpu" (default) uses NumPy, "cuda" or "auto" use torch on the GPU if available
+def get_device(preferred_device=None):
+    try:
+        if preferred_device not in ("cuda", "auto"):
+            device = "cpu"
+            logging.info("Using CPU for computation.")
+        elif is_cuda_available():
+            device = "cuda"
+            import_torch().backends.cudnn.benchmark = True
+            logging.info("Using GPU for computation.")
+        else:
+            device = "cpu"
+            if preferred_device == "cuda":
+                logging.warning("CUDA was requested but is not available.")
+            logging.info("Using CPU for computation.")
+        return device
+    except Exception as e:
+        logging.error(f"Error in device selection: {e}")
+        if messagebox is not None:
+            messagebox.showerror("Error", f"An error occurred: {e}")
+        return "cpu"
+
+# Reset color range to default values
+def reset_color_range():
+    try:
+        app.num_colors_start_var.set(0)
+        app.num_colors_end_var.set(16777215)
+        logging.info("Color range reset to default values.")
+    except Exception as e:
+        logging.error(f"Error in reset_color_range: {e}")
+        messagebox.showerror("Error", f"An error occurred: {e}")
+
+# GUI class
+class RGBPixelGeneratorGUI:
+    def __init__(self, root):
+        self.root = root
+        self.root.title("RGB_Pixel_Generator")
+        self.root.resizable(True, True)  # Allow window resizing
+
+        # Colors for the design
+        bg_color = "#1D3557"        # Background color of the main window
+        label_color = "#457B9D"     # Label color
+        entry_bg_color = "#A8DADC"  # Background color of entry fields
+        button_color = "#E63946"    # Button background color
+        button_text_color = "white" # Button text color
+        entry_text_color = "black"  # Entry text color
+
+        self.root.configure(bg=bg_color)
+
+        # Define labels and input fields
+        Label(self.root, text="Output dir:", bg=label_color, fg="white", font=("Arial", 10, "bold")).grid(row=0, column=0, padx=10, pady=10, sticky=W)
+        self.output_dir_var = StringVar()
+        output_dir_entry = Entry(self.root, textvariable=self.output_dir_var, width=40, bg=entry_bg_color, fg=entry_text_color, font=("Arial", 10))
+        output_dir_entry.grid(row=0, column=1, padx=10, pady=10)
+        output_dir_button = Button(self.root, text="Output", command=select_output_folder, bg=button_color, fg=button_text_color, font=("Arial", 10, "bold"))
+        output_dir_button.grid(row=0, column=2, padx=10, pady=10)
+
+        Label(self.root, text="Output format:", bg=label_color, fg="white", font=("Arial", 10, "bold")).grid(row=1, column=0, padx=10, pady=10, sticky=W)
+        self.output_format_var = StringVar(value="png")
+        output_format_menu = OptionMenu(self.root, self.output_format_var, *OUTPUT_FORMATS)
+        output_format_menu.config(bg=entry_bg_color, fg=entry_text_color, font=("Arial", 10))
+        output_format_menu.grid(row=1, column=1, padx=10, pady=10, sticky=W)
+
+        Label(self.root, text="Image size:", bg=label_color, fg="white", font=("Arial", 10, "bold")).grid(row=2, column=0, padx=10, pady=10, sticky=W)
+        self.image_width_var = IntVar(value=1)
+        image_width_entry = Entry(self.root, textvariable=self.image_width_var, width=10, bg=entry_bg_color, fg=entry_text_color, font=("Arial", 10))
+        image_width_entry.grid(row=2, column=1, padx=10, pady=10, sticky=W)
+        Label(self.root, text="x", bg=label_color, fg="white", font=("Arial", 10, "bold")).grid(row=2, column=1, padx=70, pady=10, sticky=W)
+        self.image_height_var = IntVar(value=1)
+        image_height_entry = Entry(self.root, textvariable=self.image_height_var, width=10, bg=entry_bg_color, fg=entry_text_color, font=("Arial", 10))
+        image_height_entry.grid(row=2, column=1, padx=100, pady=10, sticky=W)
+
+        Label(self.root, text="Color range:", bg=label_color, fg="white", font=("Arial", 10, "bold")).grid(row=3, column=0, padx=10, pady=10, sticky=W)
+        self.num_colors_start_var = IntVar(value=0)
+        self.num_colors_end_var = IntVar(value=16777215)
+        num_colors_start_entry = Entry(self.root, textvariable=self.num_colors_start_var, width=10, bg=entry_bg_color, fg=entry_text_color, font=("Arial", 10))
+        num_colors_start_entry.grid(row=3, column=1, padx=10, pady=10, sticky=W)
+        Label(self.root, text="to", bg=label_color, fg="white", font=("Arial", 10, "bold")).grid(row=3, column=1, padx=70, pady=10, sticky=W)
+        num_colors_end_entry = Entry(self.root, textvariable=self.num_colors_end_var, width=10, bg=entry_bg_color, fg=entry_text_color, font=("Arial", 10))
+        num_colors_end_entry.grid(row=3, column=1, padx=100, pady=10, sticky=W)
+        reset_button = Button(self.root, text="Reset", command=reset_color_range, bg=button_color, fg=button_text_color, font=("Arial", 8, "bold"))
+        reset_button.grid(row=3, column=2, padx=10, pady=10, sticky=W)
+
+        Label(self.root, text="Colors per image:", bg=label_color, fg="white", font=("Arial", 10, "bold")).grid(row=4, column=0, padx=10, pady=10, sticky=W)
+        self.colors_per_image_var = IntVar(value=5)
+        colors_per_image_entry = Entry(self.root, textvariable=self.colors_per_image_var, width=10, bg=entry_bg_color, fg=entry_text_color, font=("Arial", 10))
+        colors_per_image_entry.grid(row=4, column=1, padx=10, pady=10, sticky=W)
+
+        Label(self.root, text="Pattern type:", bg=label_color, fg="white", font=("Arial", 10, "bold")).grid(row=5, column=0, padx=10, pady=10, sticky=W)
+        self.pattern_type_var = StringVar(value="single")
+        pattern_type_menu = OptionMenu(self.root, self.pattern_type_var, "single", "mandala")
+        pattern_type_menu.config(bg=entry_bg_color, fg=entry_text_color, font=("Arial", 10))
+        pattern_type_menu.grid(row=5, column=1, padx=10, pady=10, sticky=W)
+
+        # Progress label and frame for speed and elapsed time
+        self.progress_label = Label(self.root, text="Progress: 0/0 images generated.", bg=bg_color, fg="white", font=("Arial", 10))
+        self.progress_label.grid(row=6, column=0, columnspan=3, pady=5)
+
+        speed_frame = Frame(self.root, bg=bg_color)
+        speed_frame.grid(row=7, column=0, columnspan=3, padx=10, pady=10)
+
+        self.speed_label = Label(speed_frame, text="Image per second: 0", bg=bg_color, fg="white", font=("Arial", 10))
+        self.speed_label.grid(row=0, column=0, columnspan=3, pady=0)
+
+        self.elapsed_label = Label(speed_frame, text="Elapsed Time: 00:00:00", bg=bg_color, fg="white", font=("Arial", 10))
+        self.elapsed_label.grid(row=1, column=0, columnspan=3, pady=0)
+
+        self.progress_bar = ttk.Progressbar(self.root, length=500, mode='determinate')
+        self.progress_bar.grid(row=8, column=0, columnspan=3, padx=10, pady=5)
+
+        self.info_label = Label(self.root, text="Skipped images: 0", bg=bg_color, fg="white", font=("Arial", 10))
+        self.info_label.grid(row=9, column=0, columnspan=3, pady=5)
+
+        # Buttons (Start and Stop)
+        button_frame = Frame(self.root, bg=bg_color)
+        button_frame.grid(row=10, column=0, columnspan=3, padx=10, pady=10)
+
+        start_button = Button(button_frame, text="Start", command=start_generation, bg=button_color, fg=button_text_color, font=("Arial", 12))
+        start_button.grid(row=0, column=0, padx=10)
+
+        stop_button = Button(button_frame, text="Stop", command=stop_generation_process, bg=button_color, fg=button_text_color, font=("Arial", 12))
+        stop_button.grid(row=0, column=1, padx=10)
+
+        # Progress arrives from the generation threads, the widgets are only updated from the Tk main loop
+        self.pending_progress = None
+        self.root.after(int(PROGRESS_INTERVAL * 1000), self.poll_progress)
+
+    def schedule_progress_update(self, *progress):
+        self.pending_progress = progress
+
+    def poll_progress(self):
+        progress, self.pending_progress = self.pending_progress, None
+        if progress is not None:
+            self.update_progress_gui(*progress)
+        self.root.after(int(PROGRESS_INTERVAL * 1000), self.poll_progress)
+
+    def update_progress_gui(self, images_generated, total_images, estimated_time, images_per_second, skipped_images, elapsed_time):
+        try:
+            self.progress_label.config(
+                text=f"Progress: {images_generated}/{total_images} "
+                     f"Remaining time: {format_time(estimated_time)}"
+            )
+            self.progress_bar['value'] = (images_generated / total_images) * 100
+            self.info_label.config(text=f"Skipped Images: {skipped_images}")
+            self.speed_label.config(text=f"Images per Second: {images_per_second:.2f}")
+            self.elapsed_label.config(text=f"Elapsed Time: {format_time(elapsed_time)}")
+            logging.debug(f"Progress: {images_generated}/{total_images}, Remaining time: {format_time(estimated_time)}, Images per second: {images_per_second:.2f}, Elapsed time: {format_time(elapsed_time)}, Skipped images: {skipped_images}")
+        except Exception as e:
+            logging.error(f"Error in update_progress_gui: {e}")
+            messagebox.showerror("Error", f"An error occurred: {e}")
+
+# Start the main loop of the Tkinter window
+def start_gui():
+    global app
+    root = Tk()
+    app = RGBPixelGeneratorGUI(root)
+    root.mainloop()
+
+# Progress reporting for the command line interface, limited to one report per interval
+def create_cli_progress_callback(progress_format, interval=1.0):
+    last_report = 0
+
+    def report_progress(images_generated, total_images, estimated_time, images_per_second, skipped_images, elapsed_time):
+        nonlocal last_report
+        if progress_format == "none" or time.time() - last_report < interval:
+            return
+        last_report = time.time()
+        if progress_format == "json":
+            print(json.dumps({
+                "images_generated": images_generated,
+                "total_images": total_images,
+                "skipped_images": skipped_images,
+                "images_per_second": round(images_per_second, 2),
+                "elapsed_time": round(elapsed_time, 3),
+                "estimated_time": round(estimated_time, 3),
+            }), flush=True)
+        else:
+            logging.info(f"Progress: {images_generated}/{total_images}, Remaining time: {format_time(estimated_time)}, Images per second: {images_per_second:.2f}, Elapsed time: {format_time(elapsed_time)}, Skipped images: {skipped_images}")
+
+    return report_progress
+
+# Command line arguments
+def parse_folder_layout(layout):
+    """
+    Validates a folder layout argument and returns it normalized, e.g. "prefix" -> "prefix:2".
+    """
+    try:
+        return str(FolderLayout.parse(layout))
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+def build_argument_parser():
+    parser = argparse.ArgumentParser(prog="generator", description="Generate RGB pixel images. Without a command the GUI is started.")
+    subparsers = parser.add_subparsers(dest="command")
+
+    subparsers.add_parser("gui", help="Start the GUI")
+
+    generate_parser = subparsers.add_parser("generate", help="Generate images without the GUI")
+    generate_parser.add_argument("--output-dir", required=True, help="Output directory (RGB_Colors is appended if missing)")
+    generate_parser.add_argument("--start", type=int, default=0, help="First color index (default: 0)")
+    generate_parser.add_argument("--end", type=int, default=16777215, help="End of the color range (default: 16777215)")
+    generate_parser.add_argument("--colors", choices=COLOR_SOURCE_KINDS, default=None, help="Color source: range (--start/--end), lattice or file (default: range, file if --palette is given)")
+    generate_parser.add_argument("--stride", type=int, default=1, help="Take every n-th color of the range (default: 1)")
+    generate_parser.add_argument("--lattice-step", type=int, default=4, help="Lattice source: every n-th level per channel (default: 4)")
+    generate_parser.add_argument("--palette", help="File source: palette with one hex color or CSV r,g,b row per line")
+    generate_parser.add_argument("--shuffle", type=int, default=None, metavar="SEED", help="Visit the colors in a seeded random order")
+    generate_parser.add_argument("--count", type=int, default=None, help="Generate only the first n colors of the source (e.g. a random sample with --shuffle)")
+    generate_parser.add_argument("--shard", type=parse_shard, default=None, metavar="K/N", help="Generate only shard K of N balanced shards (K from 0), e.g. one per machine")
+    generate_parser.add_argument("--claim-dir", help="Shared directory coordinating a distributed run: work units are claimed with lease files, idle machines steal unfinished units")
+    generate_parser.add_argument("--unit-size", type=int, default=DEFAULT_UNIT_SIZE, help=f"Colors per work unit of a distributed run (default: {DEFAULT_UNIT_SIZE})")
+    generate_parser.add_argument("--owner", help="Name of this machine in a distributed run, it names its leases and completion manifest (default: the host name)")
+    generate_parser.add_argument("--lease-timeout", type=float, default=DEFAULT_LEASE_TIMEOUT, help=f"Seconds without heartbeat after which a lease may be stolen (default: {DEFAULT_LEASE_TIMEOUT:.0f})")
+    generate_parser.add_argument("--width", type=int, default=1, help="Image width in pixels (default: 1)")
+    generate_parser.add_argument("--height", type=int, default=1, help="Image height in pixels (default: 1)")
+    generate_parser.add_argument("--colors-per-image", type=int, default=5, help="Colors per mandala image (default: 5)")
+    generate_parser.add_argument("--seed", type=int, default=DEFAULT_MANDALA_SEED, help=f"Seed of the random mandala colors (default: {DEFAULT_MANDALA_SEED})")
+    generate_parser.add_argument("--pattern", choices=("single", "mandala"), default="single", help="Pattern type (default: single)")
+    generate_parser.add_argument("--targets", nargs="+", metavar="PATTERN:WxH[:COLORS]", help="Render several targets in one sweep, e.g. single:1x1 single:8x8 mandala:32x32:5 (replaces --pattern/--width/--height)")
+    generate_parser.add_argument("--job", help="JSON job spec with a list of targets (see --targets)")
+    generate_parser.add_argument("--output-format", choices=OUTPUT_FORMATS, default="png", help="Output format (default: png)")
+    generate_parser.add_argument("--layout", type=parse_folder_layout, default="flat", help="Directory layout of png output: flat, prefix[:depth] (FF/A0/FFA0C3.png) or hashed[:depth] (default: flat)")
+    generate_parser.add_argument("--shard-size", type=int, default=DEFAULT_SHARD_SIZE, help=f"Images per shard for npy/tar (default: {DEFAULT_SHARD_SIZE})")
+    generate_parser.add_argument("--png-compression", type=int, choices=range(10), default=DEFAULT_PNG_COMPRESS_LEVEL, metavar="0-9", help=f"PNG compression level, 0 = stored, 1 = fastest (default: {DEFAULT_PNG_COMPRESS_LEVEL})")
+    generate_parser.add_argument("--device", choices=("cpu", "cuda", "auto"), default="cpu", help="Compute device: cpu (NumPy, default), cuda or auto (GPU if available, requires torch)")
+    generate_parser.add_argument("--backend", choices=GENERATION_BACKENDS, default="process", help="Worker processes or threads (default: process)")
+    generate_parser.add_argument("--workers", type=int, default=None, help="Number of workers (default: all CPU cores)")
+    generate_parser.add_argument("--verify", action="store_true", help="Rebuild the completion manifest from the files on disk before generating")
+    generate_parser.add_argument("--progress", choices=("log", "json", "none"), default="log", help="Progress reporting: log lines, JSON lines on stdout or none (default: log)")
+    generate_parser.add_argument("--profile", metavar="DIR", help="Record per-stage timings and write profile.json and a Chrome trace (trace.json) to DIR")
+    generate_parser.add_argument("--python-profiler", choices=PYTHON_PROFILERS, default=None, help="With --profile, also profile the Python code with cProfile (python.prof) or a sampling profiler (python.collapsed)")
+    generate_parser.add_argument("--log-level", choices=("DEBUG", "INFO", "WARNING", "ERROR"), default="INFO", help="Log level (default: INFO)")
+
+    migrate_parser = subparsers.add_parser("migrate", help="Move the png images of a color folder into another directory layout")
+    migrate_parser.add_argument("folder", help="Color folder, e.g. RGB_Colors/Single/1x1")
+    migrate_parser.add_argument("--layout", type=parse_folder_layout, required=True, help="Target layout: flat, prefix[:depth] or hashed[:depth]")
+    migrate_parser.add_argument("--log-level", choices=("DEBUG", "INFO", "WARNING", "ERROR"), default="INFO", help="Log level (default: INFO)")
+
+    merge_parser = subparsers.add_parser("merge", help="Validate that a distributed run covers every color and print a JSON report")
+    merge_parser.add_argument("--claim-dir", required=True, help="Shared directory of the distributed run")
+    merge_parser.add_argument("--output-dir", help="Output directory (default: the one of the machine that started the run)")
+    merge_parser.add_argument("--log-level", choices=("DEBUG", "INFO", "WARNING", "ERROR"), default="INFO", help="Log level (default: INFO)")
+
+    benchmark_parser = subparsers.add_parser("benchmark", help="Measure throughput for a sweep of settings and print a JSON report")
+    benchmark_parser.add_argument("--patterns", nargs="+", choices=("single", "mandala"), default=["single", "mandala"], help="Pattern types (default: single mandala)")
+    benchmark_parser.add_argument("--sizes", nargs="+", type=parse_image_size, default=list(BENCHMARK_SIZES), help="Image sizes as WxH (default: 1x1 8x8 64x64 512x512)")
+    benchmark_parser.add_argument("--colors-per-image", nargs="+", type=int, default=[5], help="Colors per mandala image (default: 5)")
+    benchmark_parser.add_argument("--workers", nargs="+", type=int, default=[None], help="Worker counts (default: all CPU cores)")
+    benchmark_parser.add_argument("--devices", nargs="+", choices=("cpu", "cuda"), default=["cpu"], help="Devices (default: cpu)")
+    benchmark_parser.add_argument("--images", type=int, default=1000, help="Images per run (default: 1000)")
+    benchmark_parser.add_argument("--output-format", choices=OUTPUT_FORMATS, default="png", help="Output format (default: png)")
+    benchmark_parser.add_argument("--backend", choices=GENERATION_BACKENDS, default="process", help="Worker processes or threads (default: process)")
+    benchmark_parser.add_argument("--png-compression", type=int, choices=range(10), default=DEFAULT_PNG_COMPRESS_LEVEL, metavar="0-9", help=f"PNG compression level (default: {DEFAULT_PNG_COMPRESS_LEVEL})")
+    benchmark_parser.add_argument("--output", help="Write the JSON report to this file instead of stdout")
+    benchmark_parser.add_argument("--log-level", choices=("DEBUG", "INFO", "WARNING", "ERROR"), default="WARNING", help="Log level (default: WARNING)")
+
+    return parser
+
+# Command line entry point, returns the process exit code
+def main(argv=None):
+    args = build_argument_parser().parse_args(argv)
+
+    if args.command in (None, "gui"):
+        if Tk is None:
+            logging.error("Tk is not available, use the generate command to run without the GUI.")
+            return 1
+        # Start the GUI in the main thread
+        start_gui()
+        return 0
+
+    logging.getLogger().setLevel(args.log_level)
+    if args.command == "benchmark":
+        return run_benchmark_command(args)
+    if args.command == "merge":
+        return run_merge_command(args)
+    if args.command == "migrate":
+        return run_migrate_command(args)
+    return run_generate_command(args)
+
+def run_generate_command(args):
+    try:
+        if args.python_profiler and not args.profile:
+            raise ValueError("--python-profiler requires --profile")
+        color_source_settings = {
+            "kind": args.colors or ("file" if args.palette else "range"), "start": args.start, "end": args.end,
+            "stride": args.stride, "lattice_step": args.lattice_step,
+            "palette_path": os.path.abspath(args.palette) if args.palette else None,
+            "shuffle_seed": args.shuffle, "count": args.count,
+        }
+        if args.job:
+            targets = load_job_targets(args.job)
+        elif args.targets:
+            targets = [parse_target(target) for target in args.targets]
+        else:
+            targets = [{"pattern_type": args.pattern, "image_width": args.width, "image_height": args.height, "colors_per_image": args.colors_per_image}]
+        shard_index, num_shards = args.shard or (0, 1)
+        if args.claim_dir:
+            job = {
+                "color_source": color_source_settings, "targets": targets, "output_format": args.output_format,
+                "shard_size": args.shard_size, "seed": args.seed, "layout": args.layout, "unit_size": args.unit_size,
+            }
+            result = run_distributed_generation(
+                args.output_dir, args.claim_dir, job, shard_index, num_shards, args.owner, args.lease_timeout,
+                progress_callback=create_cli_progress_callback(args.progress), backend=args.backend, workers=args.workers,
+                verify=args.verify, png_compress_level=args.png_compression, device=args.device,
+                profile_dir=args.profile, python_profiler=args.python_profiler
+            )
+            if args.progress == "json":
+                print(json.dumps(result), flush=True)
+            return 0 if result["status"] == "completed" else 130
+
+        color_source = create_color_source(**color_source_settings)
+        if args.shard:
+            color_source = SliceColorSource(color_source, *shard_range(len(color_source), shard_index, num_shards))
+        result = run_generation_job(
+            args.output_dir, targets, color_source, args.output_format, args.shard_size,
+            create_cli_progress_callback(args.progress), args.backend, args.workers, args.verify,
+            args.png_compression, args.device, args.seed, args.layout, args.profile, args.python_profiler
+        )
+    except Exception as e:
+        logging.error(f"Error during image generation: {e}", exc_info=True)
+        return 1
+
+    if args.progress == "json":
+        print(json.dumps(result), flush=True)
+    return 0 if result["status"] == "completed" else 130
+
+def run_migrate_command(args):
+    try:
+        migrate_folder_layout(args.folder, FolderLayout.parse(args.layout))
+    except Exception as e:
+        logging.error(f"Error during layout migration: {e}", exc_info=True)
+        return 1
+    return 0
+
+def run_merge_command(args):
+    try:
+        report = validate_coverage(args.claim_dir, args.output_dir)
+    except Exception as e:
+        logging.error(f"Error during coverage validation: {e}", exc_info=True)
+        return 1
+
+    print(json.dumps(report, indent=2), flush=True)
+    return 0 if report["complete"] else 1
+
+def run_benchmark_command(args):
+    try:
+        report = run_benchmark(args.patterns, args.sizes, args.colors_per_image, args.workers, args.devices,
+                               args.images, args.output_format, args.backend, args.png_compression)
+    except Exception as e:
+        logging.error(f"Error during benchmark: {e}", exc_info=True)
+        return 1
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        logging.info(f"Benchmark report written to {args.output}.")
+    else:
+        print(json.dumps(report, indent=2), flush=True)
+    return 0
+
+if __name__ == "__main__":
+    # Needed for the worker processes of the frozen (PyInstaller) executable
+    multiprocessing.freeze_support()
+    sys.exit(main())
@@ -0,0 +1,55 @@
+import types
+
+import generator
+
+TARGETS = [{"pattern_type": "mandala", "image_width": 32, "image_height": 32, "colors_per_image": 5}]
+
+
+class FakeProcess:
+    """
+    Stands in for psutil.Process, memory_info() reports the rss attribute.
+    """
+    def __init__(self, rss):
+        self.rss = rss
+
+    def memory_info(self):
+        return types.SimpleNamespace(rss=self.rss)
+
+
+def create_planner(available_ram_mb=1024):
+    planner = generator.BatchSizePlanner(TARGETS, available_ram_mb, 0)
+    planner.process = FakeProcess(planner.batch_start_rss)
+    return planner
+
+
+def test_retained_memory_does_not_shrink_every_batch():
+    planner = create_planner()
+    planned = (planner.batch_size, planner.chunk_size, planner.render_chunk_size)
+
+    # The first batch grows the RSS beyond the budget, the allocator keeps the pages afterwards
+    planner.process.rss += int(planner.host_budget * 2)
+    planner.adapt()
+    shrunk = (planner.batch_size, planner.chunk_size, planner.render_chunk_size)
+    assert all(after < before for after, before in zip(shrunk, planned) if before > 1)
+
+    # Later batches stay at the high RSS without growing it further
+    for _ in range(20):
+        planner.sample()
+        planner.adapt()
+    assert planner.chunk_size > 1 and planner.render_chunk_size > 1
+    assert planner.batch_size == planner.max_batch_size
+
+
+def test_batch_size_shrinks_with_growth_and_stays_within_limits():
+    planner = create_planner()
+    for _ in range(40):
+        planner.process.rss += int(planner.host_budget * 2)
+        planner.adapt()
+    assert planner.batch_size == generator.MIN_BATCH_SIZE
+    assert planner.chunk_size == 1 and planner.render_chunk_size == 1
+
+    for _ in range(40):
+        planner.adapt()
+    assert planner.batch_size == planner.max_batch_size
+    assert planner.chunk_size == generator.PIPELINE_CHUNK_SIZE
+    assert planner.render_chunk_size == generator.PIPELINE_RENDER_CHUNK_SIZE
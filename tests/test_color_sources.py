@@ -0,0 +1,80 @@
+import numpy as np
+import pytest
+
+import generator
+
+
+def all_color_indices(source):
+    return source.color_indices(0, len(source))
+
+
+@pytest.mark.parametrize("length", [1, 2, 3, 5, 100, 1000, 4097, 65537])
+def test_shuffled_source_is_a_permutation(length):
+    source = generator.RangeColorSource(10, 10 + length)
+    shuffled = generator.ShuffledColorSource(source, seed=42)
+    assert len(shuffled) == length
+    color_indices = all_color_indices(shuffled)
+    assert sorted(color_indices.tolist()) == list(range(10, 10 + length))
+    # Lookups of single positions agree with whole batches
+    positions = np.array([0, length // 2, length - 1])
+    assert shuffled.color_indices_at(positions).tolist() == color_indices[positions].tolist()
+
+
+def test_shuffled_source_depends_on_the_seed():
+    source = generator.RangeColorSource(0, 1000)
+    first = all_color_indices(generator.ShuffledColorSource(source, 1))
+    assert np.array_equal(first, all_color_indices(generator.ShuffledColorSource(source, 1)))
+    assert not np.array_equal(first, all_color_indices(generator.ShuffledColorSource(source, 2)))
+    assert not np.array_equal(first, np.arange(1000))
+
+
+@pytest.mark.parametrize("step", [1, 3, 4, 100, 256])
+def test_lattice_source_values(step):
+    source = generator.LatticeColorSource(step)
+    levels = list(range(0, 256, step))
+    assert len(source) == len(levels) ** 3
+    if step == 1:
+        return  # The full cube, its values are the range source
+    expected = sorted(r + g * 256 + b * 65536 for b in levels for g in levels for r in levels)
+    color_indices = all_color_indices(source)
+    assert sorted(color_indices.tolist()) == expected
+    # Red changes fastest
+    if len(levels) > 1:
+        assert color_indices[:2].tolist() == [0, step]
+
+
+def test_lattice_source_rejects_invalid_steps():
+    for step in (0, 257):
+        with pytest.raises(ValueError):
+            generator.LatticeColorSource(step)
+
+
+def test_list_source_reads_hex_lines(tmp_path):
+    palette_path = tmp_path / "palette.txt"
+    palette_path.write_text("FF0000\n#00ff00\n\n0x0000FF\nFF0000\n")
+    source = generator.ListColorSource.from_file(str(palette_path))
+    # Duplicates are dropped, the first occurrence keeps its position
+    assert all_color_indices(source).tolist() == [0x0000FF, 0x00FF00, 0xFF0000]
+    assert [generator.color_index_to_hex(color_index) for color_index in all_color_indices(source).tolist()] == ["FF0000", "00FF00", "0000FF"]
+
+
+def test_list_source_reads_csv_with_header(tmp_path):
+    palette_path = tmp_path / "palette.csv"
+    palette_path.write_text("r,g,b\n1,2,3\n255, 255, 255\n0;0;0\n")
+    source = generator.ListColorSource.from_file(str(palette_path))
+    assert all_color_indices(source).tolist() == [1 + 2 * 256 + 3 * 65536, 0xFFFFFF, 0]
+
+
+@pytest.mark.parametrize("content", ["FF0000\nnot a color\n", "1,2,300\n"])
+def test_list_source_rejects_invalid_lines(tmp_path, content):
+    palette_path = tmp_path / "palette.txt"
+    palette_path.write_text(content)
+    with pytest.raises(ValueError):
+        generator.ListColorSource.from_file(str(palette_path))
+
+
+def test_range_and_slice_sources():
+    source = generator.RangeColorSource(5, 20, stride=4)
+    assert all_color_indices(source).tolist() == [5, 9, 13, 17]
+    assert all_color_indices(generator.SliceColorSource(source, 1, 3)).tolist() == [9, 13]
+    assert len(generator.SliceColorSource(source, 3, 100)) == 1
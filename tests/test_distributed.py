@@ -0,0 +1,149 @@
+import json
+import os
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+import generator
+
+GENERATOR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "generator.py")
+
+
+def read_lease_owner(claims, unit):
+    with open(claims.unit_path(unit, "lease")) as lease_file:
+        return json.load(lease_file)["owner"]
+
+
+def make_stale(claims, unit):
+    stale_time = time.time() - 2 * claims.lease_timeout
+    os.utime(claims.unit_path(unit, "lease"), (stale_time, stale_time))
+
+
+def test_fresh_lease_is_not_stolen(tmp_path):
+    owner_a = generator.ClaimDirectory(str(tmp_path), "a", lease_timeout=60)
+    owner_b = generator.ClaimDirectory(str(tmp_path), "b", lease_timeout=60)
+    assert owner_a.try_claim(0)
+    assert not owner_b.try_claim(0)
+    assert read_lease_owner(owner_a, 0) == "a"
+
+
+def test_stale_lease_is_stolen(tmp_path):
+    owner_a = generator.ClaimDirectory(str(tmp_path), "a", lease_timeout=60)
+    owner_b = generator.ClaimDirectory(str(tmp_path), "b", lease_timeout=60)
+    assert owner_a.try_claim(0)
+    make_stale(owner_a, 0)
+    assert owner_b.try_claim(0)
+    assert read_lease_owner(owner_b, 0) == "b"
+    assert sorted(os.listdir(tmp_path)) == ["unit_00000000.lease"]
+
+
+def test_lease_claimed_during_a_steal_is_put_back(tmp_path):
+    owner_a = generator.ClaimDirectory(str(tmp_path), "a", lease_timeout=60)
+    owner_c = generator.ClaimDirectory(str(tmp_path), "c", lease_timeout=60)
+
+    class RacingClaimDirectory(generator.ClaimDirectory):
+        def is_stale(self, lease_path):
+            stale = super().is_stale(lease_path)
+            if lease_path.endswith(".lease"):
+                # Machine c steals the stale lease and claims the unit between our check and our rename
+                assert owner_c.try_claim(0)
+            return stale
+
+    owner_b = RacingClaimDirectory(str(tmp_path), "b", lease_timeout=60)
+    assert owner_a.try_claim(0)
+    make_stale(owner_a, 0)
+    assert not owner_b.try_claim(0)
+    assert read_lease_owner(owner_c, 0) == "c"
+    assert sorted(os.listdir(tmp_path)) == ["unit_00000000.lease"]
+
+
+def test_machine_manifests_are_read_together(tmp_path):
+    color_folder = str(tmp_path)
+    manifest_a = generator.CompletionManifest.open(color_folder, "npy", owner="host-a")
+    manifest_b = generator.CompletionManifest.open(color_folder, "npy", owner="host-b")
+    # Interleaved colors share the pages of the manifests
+    manifest_a.mark([0, 2, 4])
+    manifest_b.mark([1, 3])
+    manifest_a.flush()
+    manifest_b.flush()
+
+    shared_path = generator.CompletionManifest.get_path(color_folder, "npy")
+    assert manifest_a.manifest_path != shared_path and shared_path in manifest_a.shared_paths
+    assert generator.CompletionManifest.open(color_folder, "npy").completed_mask(0, 6).tolist() == [True] * 5 + [False]
+    # Machines that join later are seen when the manifests are opened for the next unit
+    assert generator.CompletionManifest.open(color_folder, "npy", owner="host-a").completed_mask(0, 6).tolist() == [True] * 5 + [False]
+    # verify only trusts the files on disk
+    assert not generator.CompletionManifest.open(color_folder, "npy", verify=True).completed_mask(0, 6).any()
+
+
+def test_local_processes_cover_the_job(tmp_path):
+    output_dir, claim_dir = str(tmp_path / "out"), str(tmp_path / "claims")
+    command = [sys.executable, GENERATOR, "generate", "--output-dir", output_dir, "--claim-dir", claim_dir,
+               "--end", "6000", "--unit-size", "500", "--shuffle", "7", "--output-format", "npy", "--shard-size", "200",
+               "--backend", "thread", "--workers", "1", "--progress", "none", "--log-level", "WARNING"]
+    machines = [subprocess.Popen(command + ["--shard", f"{shard_index}/3", "--owner", f"machine-{shard_index}"]) for shard_index in range(3)]
+    assert [machine.wait(timeout=300) for machine in machines] == [0, 0, 0]
+
+    result = subprocess.run([sys.executable, GENERATOR, "merge", "--claim-dir", claim_dir, "--log-level", "WARNING"],
+                            capture_output=True, text=True, timeout=300)
+    assert result.returncode == 0, result.stderr
+    report = json.loads(result.stdout)
+    assert report["complete"]
+    assert report["pending_units"] == []
+    assert report["completed_images"] == report["total_images"] == 6000
+
+    # Every color was written exactly once
+    color_folder = report["targets"][0]["output_folder"]
+    colors = np.concatenate([np.load(os.path.join(color_folder, name)) for name in os.listdir(color_folder) if name.endswith(".colors.npy")])
+    assert len(colors) == len(np.unique(colors)) == 6000
+
+
+def run_distributed(output_dir, claim_dir, verify=False):
+    job = {"color_source": {"kind": "range", "start": 0, "end": 1000}, "targets": [generator.parse_target("single:1x1")],
+           "output_format": "png", "shard_size": 100, "seed": 0, "layout": "flat", "unit_size": 500}
+    return generator.run_distributed_generation(output_dir, claim_dir, job, backend="thread", workers=1, verify=verify)
+
+
+def test_verify_regenerates_deleted_images(tmp_path):
+    output_dir = str(tmp_path / "out")
+    assert run_distributed(output_dir, str(tmp_path / "claims"))["images_generated"] == 1000
+    color_folder = generator.get_color_folder(output_dir, "single", 1, 1)
+    for color_index in (10, 700):
+        os.remove(generator.find_image_path(color_folder, color_index))
+
+    summary = run_distributed(output_dir, str(tmp_path / "claims_verify"), verify=True)
+    assert summary["images_generated"] == 2
+    assert generator.validate_coverage(str(tmp_path / "claims_verify"))["complete"]
+
+    # A verifying plain run does not trust the machine manifests either, not even one run later
+    os.remove(generator.find_image_path(color_folder, 20))
+    assert generator.run_generation(output_dir, 0, 1000, 1, 1, backend="thread", workers=1, verify=True)["images_generated"] == 1
+    os.remove(generator.find_image_path(color_folder, 30))
+    run_distributed(output_dir, str(tmp_path / "claims_again"))
+    assert generator.run_generation(output_dir, 0, 1000, 1, 1, backend="thread", workers=1, verify=True)["images_generated"] == 1
+    assert os.listdir(generator.CompletionManifest.get_owner_folder(color_folder, "png")) == []
+
+
+def test_runs_of_a_host_share_its_manifest(tmp_path):
+    output_dir = str(tmp_path / "out")
+    run_distributed(output_dir, str(tmp_path / "claims_first"))
+    run_distributed(output_dir, str(tmp_path / "claims_second"))
+    owner_folder = generator.CompletionManifest.get_owner_folder(generator.get_color_folder(output_dir, "single", 1, 1), "png")
+    assert len(os.listdir(owner_folder)) == 1
+
+    # merge folds the machine manifests into the shared one
+    assert generator.validate_coverage(str(tmp_path / "claims_second"))["complete"]
+    assert os.listdir(owner_folder) == []
+
+
+def test_shared_files_are_readable_by_other_accounts(tmp_path):
+    output_dir, claim_dir = str(tmp_path / "out"), str(tmp_path / "claims")
+    run_distributed(output_dir, claim_dir)
+    color_folder = generator.get_color_folder(output_dir, "single", 1, 1)
+    paths = [os.path.join(claim_dir, "job.json"), os.path.join(claim_dir, "unit_00000000.done"),
+             generator.CompletionManifest.get_path(color_folder, "png"),
+             generator.CompletionManifest.get_owner_path(color_folder, "png", generator.ClaimDirectory(claim_dir).owner)]
+    for path in paths:
+        assert os.stat(path).st_mode & 0o777 == generator.SHARED_FILE_MODE, path
@@ -0,0 +1,50 @@
+import os
+
+import pytest
+
+import generator
+
+NUM_COLORS = 3000
+
+
+@pytest.fixture
+def color_folder(tmp_path):
+    summary = generator.run_generation(str(tmp_path), 0, NUM_COLORS, 1, 1, backend="thread", workers=1)
+    return summary["output_folder"]
+
+
+def image_names(color_folder):
+    return sorted(os.path.basename(path) for path in generator.PngFolderWriter.iter_image_paths(color_folder))
+
+
+@pytest.mark.parametrize("layouts", [["prefix:2", "flat"], ["prefix:1", "prefix:2", "hashed:1", "prefix:3", "flat"], ["hashed:2", "hashed:1"]])
+def test_migration_keeps_every_image(color_folder, layouts):
+    expected_names = image_names(color_folder)
+    assert len(expected_names) == NUM_COLORS
+    for layout_spec in layouts:
+        layout = generator.FolderLayout.parse(layout_spec)
+        generator.migrate_folder_layout(color_folder, layout)
+        assert generator.FolderLayout.load(color_folder) == layout
+        assert image_names(color_folder) == expected_names
+        for color_index in range(0, NUM_COLORS, 97):
+            assert os.path.exists(generator.find_image_path(color_folder, color_index, layout))
+        # Only the directories of the new layout are left
+        assert all(len(os.path.relpath(directory, color_folder).split(os.sep)) <= layout.depth
+                   for directory, _, _ in os.walk(color_folder) if directory != color_folder)
+
+
+def test_interrupted_migration_can_be_run_again(color_folder):
+    layout = generator.FolderLayout.parse("prefix:2")
+    # Move a part of the images by hand, as an interrupted migration leaves them
+    for path in list(generator.PngFolderWriter.iter_image_paths(color_folder))[::2]:
+        target_path = os.path.join(color_folder, layout.relative_path(os.path.basename(path)[:6]))
+        os.makedirs(os.path.dirname(target_path), exist_ok=True)
+        os.replace(path, target_path)
+    assert generator.migrate_folder_layout(color_folder, layout) == NUM_COLORS // 2
+    assert len(image_names(color_folder)) == NUM_COLORS
+    assert not any(entry.name.endswith(".png") for entry in os.scandir(color_folder))
+
+
+def test_layout_file_is_readable_by_other_accounts(color_folder):
+    generator.migrate_folder_layout(color_folder, generator.FolderLayout.parse("hashed:1"))
+    assert os.stat(os.path.join(color_folder, generator.FolderLayout.file_name)).st_mode & 0o777 == generator.SHARED_FILE_MODE
@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+
+import generator
+
+# Known-answer vectors of Philox4x32-10 from the Random123 distribution (kat_vectors)
+PHILOX_KNOWN_ANSWERS = [
+    ((0x00000000, 0x00000000, 0x00000000, 0x00000000), (0x00000000, 0x00000000), (0x6627E8D5, 0xE169C58D, 0xBC57AC4C, 0x9B00DBD8)),
+    ((0xFFFFFFFF, 0xFFFFFFFF, 0xFFFFFFFF, 0xFFFFFFFF), (0xFFFFFFFF, 0xFFFFFFFF), (0x408F276D, 0x41C83B0E, 0xA20BC7C6, 0x6D5451FD)),
+    ((0x243F6A88, 0x85A308D3, 0x13198A2E, 0x03707344), (0xA4093822, 0x299F31D0), (0xD16CFE09, 0x94FDCCEB, 0x5001E420, 0x24126EA1)),
+]
+
+
+@pytest.mark.parametrize("counter, key, expected", PHILOX_KNOWN_ANSWERS)
+def test_philox4x32_known_answers(counter, key, expected):
+    result = generator.philox4x32(np.array(counter, dtype=np.uint32), np.array(key, dtype=np.uint32))
+    assert result.dtype == np.uint32
+    assert result.tolist() == list(expected)
+
+
+def test_philox4x32_broadcasts_over_counters():
+    counters = np.array([counter for counter, _, _ in PHILOX_KNOWN_ANSWERS], dtype=np.uint32)
+    keys = np.array([key for _, key, _ in PHILOX_KNOWN_ANSWERS], dtype=np.uint32)
+    assert generator.philox4x32(counters, keys).tolist() == [list(expected) for _, _, expected in PHILOX_KNOWN_ANSWERS]
+
+
+@pytest.mark.parametrize("num_additional_colors", [1, 4, 6, 11])
+def test_mandala_colors_do_not_depend_on_the_batch(num_additional_colors):
+    color_indices = np.array([0, 1, 255, 65536, 123456, 16777215, 42, 7777777])
+    colors = generator.draw_mandala_colors(color_indices, num_additional_colors, seed=1234)
+    assert colors.shape == (len(color_indices), num_additional_colors, 3)
+
+    # Reversed and shuffled batches as well as single colors draw the same colors per index
+    permutation = np.random.default_rng(0).permutation(len(color_indices))
+    assert np.array_equal(generator.draw_mandala_colors(color_indices[::-1], num_additional_colors, seed=1234), colors[::-1])
+    assert np.array_equal(generator.draw_mandala_colors(color_indices[permutation], num_additional_colors, seed=1234), colors[permutation])
+    for i, color_index in enumerate(color_indices):
+        assert np.array_equal(generator.draw_mandala_colors([color_index], num_additional_colors, seed=1234)[0], colors[i])
+
+
+def test_mandala_colors_depend_on_the_seed():
+    color_indices = np.arange(100)
+    assert not np.array_equal(generator.draw_mandala_colors(color_indices, 4, seed=1), generator.draw_mandala_colors(color_indices, 4, seed=2))
+
+
+def test_rendered_mandala_does_not_depend_on_the_batch():
+    base_colors = [(12, 34, 56), (255, 0, 0), (1, 2, 3)]
+    batch = generator.render_mandala_batch(9, 7, base_colors, 4, seed=5)
+    for i, base_color in enumerate(base_colors):
+        assert np.array_equal(generator.render_mandala_batch(9, 7, [base_color], 4, seed=5)[0], batch[i])
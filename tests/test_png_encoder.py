@@ -0,0 +1,34 @@
+import io
+import os
+
+import pytest
+from PIL import Image
+
+import generator
+
+
+@pytest.mark.parametrize("compress_level", [0, 1, 6, 9])
+@pytest.mark.parametrize("image_width, image_height", [(1, 1), (2, 3), (8, 8), (31, 17), (256, 1)])
+def test_solid_color_png_matches_pillow(image_width, image_height, compress_level):
+    encoder = generator.SolidColorPngEncoder(image_width, image_height, compress_level)
+    for color in [(0, 0, 0), (255, 255, 255), (18, 52, 86), (255, 0, 128)]:
+        with Image.open(io.BytesIO(encoder.encode(color))) as image:
+            assert image.format == "PNG"
+            assert image.mode == "RGB"
+            assert image.size == (image_width, image_height)
+            assert image.tobytes() == Image.new("RGB", (image_width, image_height), color).tobytes()
+
+
+def test_solid_color_png_matches_pillow_encoder():
+    # Both encoders produce the same pixels, the files may differ in their compression
+    pixels = generator.render_solid_color_batch(5, 4, [(1, 2, 3)])[0]
+    data = generator.encode_png(pixels)
+    with Image.open(io.BytesIO(data)) as expected, Image.open(io.BytesIO(generator.get_solid_color_png_encoder(5, 4).encode((1, 2, 3)))) as image:
+        assert image.tobytes() == expected.tobytes()
+
+
+@pytest.mark.parametrize("image_width, image_height", [(0, 1), (1, 0), (-2, 4)])
+def test_empty_images_are_rejected(tmp_path, image_width, image_height):
+    with pytest.raises(ValueError):
+        generator.run_generation(str(tmp_path), 0, 3, image_width, image_height, backend="thread", workers=1)
+    assert not os.path.exists(os.path.join(str(tmp_path), "RGB_Colors"))
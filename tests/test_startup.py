@@ -0,0 +1,32 @@
+import json
+import os
+import subprocess
+import sys
+import time
+
+REPOSITORY_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Budgets for importing the generator module: torch alone takes seconds and hundreds of MB
+IMPORT_TIME_BUDGET = 3.0  # Seconds, including the interpreter start
+IMPORT_RSS_BUDGET_MB = 150
+
+IMPORT_CHECK = """
+import json, sys
+import generator
+lazy_imports = {"torch": "torch" in sys.modules, "psutil": "psutil" in sys.modules}
+# Measured after the check: the peak RSS of getrusage survives exec and would report the parent's peak
+import psutil
+print(json.dumps(dict(lazy_imports, rss_mb=psutil.Process().memory_info().rss / 1024 ** 2)))
+"""
+
+
+def test_import_is_lazy_and_within_budget():
+    start_time = time.perf_counter()
+    result = subprocess.run([sys.executable, "-c", IMPORT_CHECK], cwd=REPOSITORY_ROOT, capture_output=True, text=True, check=True)
+    elapsed_time = time.perf_counter() - start_time
+    report = json.loads(result.stdout.strip().splitlines()[-1])
+
+    assert not report["torch"], "importing generator must not import torch"
+    assert not report["psutil"], "importing generator must not import psutil"
+    assert elapsed_time < IMPORT_TIME_BUDGET
+    assert report["rss_mb"] < IMPORT_RSS_BUDGET_MB
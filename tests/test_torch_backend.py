@@ -0,0 +1,27 @@
+import numpy as np
+import pytest
+
+import generator
+
+torch = pytest.importorskip("torch")
+
+BASE_COLORS = [(0, 0, 0), (255, 255, 255), (12, 200, 99), (255, 0, 128), (1, 2, 3)]
+
+
+@pytest.mark.parametrize("image_width, image_height", [(1, 1), (8, 8), (17, 9)])
+@pytest.mark.parametrize("num_additional_colors", [0, 1, 4])
+def test_mandala_on_torch_cpu_matches_numpy(image_width, image_height, num_additional_colors):
+    expected = generator.render_mandala_batch(image_width, image_height, BASE_COLORS, num_additional_colors, "cpu", seed=3)
+    pixels = generator.render_mandala_batch(image_width, image_height, BASE_COLORS, num_additional_colors, torch.device("cpu"), seed=3)
+    assert isinstance(pixels, np.ndarray)
+    assert pixels.dtype == np.uint8
+    assert np.array_equal(pixels, expected)
+
+
+@pytest.mark.parametrize("image_width, image_height", [(1, 1), (8, 8), (17, 9)])
+def test_solid_color_on_torch_cpu_matches_numpy(image_width, image_height):
+    expected = generator.render_solid_color_batch(image_width, image_height, BASE_COLORS, "cpu")
+    pixels = generator.render_solid_color_batch(image_width, image_height, BASE_COLORS, torch.device("cpu"))
+    assert isinstance(pixels, np.ndarray)
+    assert pixels.dtype == np.uint8
+    assert np.array_equal(pixels, expected)